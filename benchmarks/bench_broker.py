@@ -0,0 +1,82 @@
+"""
+bench_broker.py
+
+Connect and collect time of repeated runs, direct or through the broker
+
+Serves a mock testbed from a session broker in this process, on a
+temporary socket, and times the connect and collection phases of several
+consecutive runs: connecting directly (a login every run), then through the
+broker (a login on the first run only, warm sessions afterwards). With
+--max-sessions below the device count, the least recently used sessions
+are evicted and logged into again, which shows what an undersized pool
+costs.
+
+    python benchmarks/bench_broker.py --devices 100 --connect-latency 0.5 --runs 3
+
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from broker import Broker, BrokerClient  # noqa: E402
+from checks import compile_plan  # noqa: E402
+from connection import connect_devices  # noqa: E402
+from mock import make_testbed  # noqa: E402
+from snapshot import SnapshotCache  # noqa: E402
+
+
+def run(testbed, plan, workers):
+    """Connect and collect like CommonSetup, return both durations"""
+    start = time.monotonic()
+    connect_devices(testbed.devices.values(), workers=workers, retries=0)
+    connected = time.monotonic()
+    SnapshotCache().collect(testbed.devices.values(), plan, workers=workers)
+    return connected - start, time.monotonic() - connected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--devices", type=int, default=100, help="mock devices")
+    parser.add_argument("--connect-latency", type=float, default=0.5, help="login seconds")
+    parser.add_argument("--latency", type=float, default=0.005, help="seconds per command")
+    parser.add_argument("--runs", type=int, default=3, help="consecutive runs")
+    parser.add_argument("--workers", type=int, default=32, help="devices handled in parallel")
+    parser.add_argument(
+        "--max-sessions", type=int, default=None, help="broker pool size, the device count by default"
+    )
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    plan = compile_plan()
+
+    def testbed():
+        return make_testbed(
+            args.devices, latency=args.latency, connect_latency=args.connect_latency
+        )
+
+    print(f"{'run':<18} {'connect':>9} {'collect':>9}")
+    for index in range(1, args.runs + 1):
+        connect, collect = run(testbed(), plan, args.workers)
+        print(f"{f'direct {index}':<18} {connect:>8.2f}s {collect:>8.2f}s")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "broker.sock")
+        broker = Broker(testbed(), max_sessions=args.max_sessions or args.devices)
+        threading.Thread(target=broker.serve, args=(path,), daemon=True).start()
+        client = BrokerClient(path)
+        while not client.available():
+            time.sleep(0.01)
+        for index in range(1, args.runs + 1):
+            connect, collect = run(client.testbed(testbed()), plan, args.workers)
+            print(f"{f'broker {index}':<18} {connect:>8.2f}s {collect:>8.2f}s")
+        print(f"{len(broker.sessions)} warm session(s) in the broker")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+bench_connect.py
+
+Wall time of the connect phase against device count
+
+Runs connection.connect_devices against in-process fake devices with a fixed
+connect latency, or against a real (e.g. unicon mock device) testbed file:
+
+    python benchmarks/bench_connect.py --counts 10 100 800 --workers 1 32 64
+    python benchmarks/bench_connect.py --testbed mock_testbed.yaml --workers 1 16
+
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from connection import connect_devices  # noqa: E402
+
+
+class FakeDevice:
+    """Device stand-in whose connect takes ``latency`` seconds"""
+
+    def __init__(self, name, latency, fail=False):
+        self.name = name
+        self.latency = latency
+        self.fail = fail
+        self.connected = False
+
+    def connect(self, **kwargs):
+        time.sleep(self.latency)
+        if self.fail:
+            raise ConnectionError(f"{self.name} refused connection")
+        self.connected = True
+
+    def destroy(self):
+        self.connected = False
+
+
+def bench(devices, workers, retries, backoff):
+    start = time.monotonic()
+    status = connect_devices(devices, workers=workers, retries=retries, backoff=backoff)
+    elapsed = time.monotonic() - start
+    failed = sum(1 for s in status.values() if not s.connected)
+    return elapsed, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--counts", type=int, nargs="+", default=[10, 100, 800])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 32, 64])
+    parser.add_argument("--latency", type=float, default=0.01, help="fake connect latency")
+    parser.add_argument("--fail-every", type=int, default=0, help="make every Nth fake device fail")
+    parser.add_argument("--retries", type=int, default=0)
+    parser.add_argument("--backoff", type=float, default=0.0)
+    parser.add_argument("--testbed", help="connect a real testbed instead of fake devices")
+    args = parser.parse_args()
+
+    # per-attempt warnings would drown the table
+    logging.getLogger("connection").setLevel(logging.ERROR)
+
+    print(f"{'devices':>8} {'workers':>8} {'wall (s)':>10} {'failed':>7}")
+    if args.testbed:
+        from pyats.topology import loader
+
+        for workers in args.workers:
+            testbed = loader.load(args.testbed)
+            devices = list(testbed.devices.values())
+            elapsed, failed = bench(devices, workers, args.retries, args.backoff)
+            print(f"{len(devices):>8} {workers:>8} {elapsed:>10.2f} {failed:>7}")
+            for device in devices:
+                device.destroy()
+        return
+
+    for count in args.counts:
+        for workers in args.workers:
+            devices = [
+                FakeDevice(
+                    f"dev{i}",
+                    args.latency,
+                    fail=bool(args.fail_every) and i % args.fail_every == 0,
+                )
+                for i in range(count)
+            ]
+            elapsed, failed = bench(devices, workers, args.retries, args.backoff)
+            print(f"{count:>8} {workers:>8} {elapsed:>10.2f} {failed:>7}")
+
+
+if __name__ == "__main__":
+    main()
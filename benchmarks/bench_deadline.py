@@ -0,0 +1,70 @@
+"""
+bench_deadline.py
+
+Wall time of a run with hung devices, with and without deadlines
+
+Collects the check plan from a mock testbed where a few devices answer
+after --slow-latency seconds, first with no deadline at all, then through
+deadline.Deadlines adapted from the connect times, and then collects a
+second time as a later test would. With deadlines the slow devices are
+given up on once, after their adaptive deadline, and skipped by the second
+pass.
+
+    python benchmarks/bench_deadline.py --devices 200 --slow 3 --slow-latency 5
+
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from checks import compile_plan  # noqa: E402
+from connection import connect_devices  # noqa: E402
+from deadline import Deadlines  # noqa: E402
+from mock import make_testbed  # noqa: E402
+from snapshot import SnapshotCache  # noqa: E402
+
+
+def collect(testbed, plan, workers, wrap=None):
+    start = time.monotonic()
+    SnapshotCache(wrap=wrap).collect(testbed.devices.values(), plan, workers=workers)
+    return time.monotonic() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--devices", type=int, default=200, help="mock devices")
+    parser.add_argument("--latency", type=float, default=0.01, help="seconds per command")
+    parser.add_argument("--slow", type=int, default=3, help="devices answering slowly")
+    parser.add_argument("--slow-latency", type=float, default=5.0, help="their seconds per command")
+    parser.add_argument("--workers", type=int, default=32, help="devices collected in parallel")
+    parser.add_argument("--max-timeout", type=float, default=30.0, help="longest device deadline")
+    parser.add_argument("--min-timeout", type=float, default=0.5, help="shortest device deadline")
+    parser.add_argument("--factor", type=float, default=5.0, help="deadline per observed latency")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    testbed = make_testbed(args.devices, latency=args.latency)
+    deadlines = Deadlines(
+        max_timeout=args.max_timeout, min_timeout=args.min_timeout, factor=args.factor
+    )
+    # every device logs in normally, and the deadlines adapt from the
+    # connect time as in CommonSetup.connect. The slow ones hang afterwards
+    for status in connect_devices(testbed.devices.values(), workers=args.workers).values():
+        deadlines.observe(status.name, status.duration)
+    for device in list(testbed)[len(testbed) - args.slow:]:
+        device.latency = args.slow_latency
+    plan = compile_plan()
+
+    print(f"{'run':<28} {'wall time':>10} {'timed out':>10}")
+    print(f"{'no deadline':<28} {collect(testbed, plan, args.workers):>9.2f}s {0:>10}")
+    for name in ("deadlines", "deadlines, later test"):
+        elapsed = collect(testbed, plan, args.workers, deadlines.device)
+        print(f"{name:<28} {elapsed:>9.2f}s {len(deadlines.timed_out):>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+bench_parsers.py
+
+Micro-benchmarks of the ASA/FXOS fast-path parsers
+
+Compares parsers.py against the code it replaced on synthetic outputs:
+parsergen.oper_fill_tabular for "show interface ip brief" (skipped when
+Genie is not installed) and the split-lines + re.findall extraction for the
+CPU and memory outputs.
+
+    python benchmarks/bench_parsers.py --interfaces 1000 10000 50000
+
+"""
+import argparse
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import parsers  # noqa: E402
+
+HEADER = "Interface                  IP-Address      OK? Method Status                Protocol\n"
+CPU_USAGE = "CPU utilization for 5 seconds = 12%; 1 minute: 9%; 5 minutes: 7%\n"
+MEMORY = (
+    "Free memory:        5033431040 bytes (59%)\n"
+    "Used memory:        3556556800 bytes (41%)\n"
+    "-------------     ------------------\n"
+    "Total memory:       8589987840 bytes (100%)\n"
+)
+
+
+def interface_output(count):
+    rows = [HEADER]
+    for i in range(count):
+        if i % 10 == 9:
+            status, protocol, address, method = "administratively down", "down", "unassigned", "unset"
+        else:
+            status, protocol, address, method = "up", "up", f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}", "manual"
+        rows.append(
+            f"GigabitEthernet{i // 48}/{i % 48:<10} {address:<15} YES {method:<6} {status:<21} {protocol}\n"
+        )
+    return "".join(rows)
+
+
+def old_cpu(output):
+    cpu_percent = re.findall(r"\d+%", output)
+    output = [i.strip("%") for i in cpu_percent]
+    return [float(i) for i in output]
+
+
+def old_memory(output):
+    memory_usage = [line for line in output.splitlines() if "Used memory" in line]
+    memory_percent = re.findall(r"\d+%", str(memory_usage))
+    stripped_memory = [i.strip("%") for i in memory_percent]
+    return [float(i) for i in stripped_memory][0]
+
+
+def report(name, func, number):
+    best = min(timeit.repeat(func, number=number, repeat=5)) / number
+    print(f"{name:<45} {best * 1e6:>12.1f} us")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--interfaces", type=int, nargs="+", default=[1000, 10000, 50000])
+    args = parser.parse_args()
+
+    try:
+        from genie import parsergen
+    except ImportError:
+        parsergen = None
+        print("genie is not installed, skipping parsergen")
+
+    header = ["Interface", "IP-Address", r"OK\?", "Method", "Status", "Protocol"]
+    for count in args.interfaces:
+        output = interface_output(count)
+        number = max(1, 20000 // count)
+        assert len(parsers.interface_ip_brief(output)) == count
+        print(f"show interface ip brief, {count} interfaces")
+        fast = report("  parsers.interface_ip_brief", lambda: parsers.interface_ip_brief(output), number)
+        if parsergen is not None:
+            slow = report(
+                "  parsergen.oper_fill_tabular",
+                lambda: parsergen.oper_fill_tabular(
+                    device_output=output, device_os="asa", header_fields=header, index=[0]
+                ),
+                number,
+            )
+            print(f"  speedup {slow / fast:.1f}x")
+
+    print("show cpu usage")
+    fast = report("  parsers.cpu_percentages", lambda: parsers.cpu_percentages(CPU_USAGE), 20000)
+    slow = report("  re.findall + strip", lambda: old_cpu(CPU_USAGE), 20000)
+    print(f"  speedup {slow / fast:.1f}x")
+    print("show memory")
+    fast = report("  parsers.used_memory_percent", lambda: parsers.used_memory_percent(MEMORY), 20000)
+    slow = report("  splitlines + re.findall(str(list))", lambda: old_memory(MEMORY), 20000)
+    print(f"  speedup {slow / fast:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+bench_plan.py
+
+Per-device latency of the compiled check plan
+
+Measures compiling checks.SPEC, then for every OS the per-device cost of
+collecting the merged command set of the plan against sending the command
+of every check on its own, as the checks did before they were compiled
+(each command costs a simulated round-trip latency), and of evaluating
+every check from the collected snapshot.
+
+    python benchmarks/bench_plan.py --devices 200 --rtt 0.005
+
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from checks import CHECKS, compile_plan  # noqa: E402
+from snapshot import SnapshotCache  # noqa: E402
+
+RAW = {
+    "show version": "Cisco Adaptive Security Appliance Software Version 9.12\nasa up 10 days 3 hours\n",
+    "show version system": "Version: 2.8\nUptime: up 12 days 1 hour\n",
+    "show interface ip brief": (
+        "Interface                  IP-Address      OK? Method Status                Protocol\n"
+        + "".join(
+            f"GigabitEthernet0/{i:<12} 10.0.0.{i:<8} YES manual up                    up\n"
+            for i in range(48)
+        )
+    ),
+    "show cpu usage": "CPU utilization for 5 seconds = 12%; 1 minute: 9%; 5 minutes: 7%\n",
+    "show cpu": "CPU 0 12%\nCPU 1 9%\n",
+    "show memory": "Free memory: 5033431040 bytes (59%)\nUsed memory: 3556556800 bytes (41%)\n",
+    "show system resource": "Memory usage:   16400152K total,   6351272K used,   10048880K free\n",
+    "show platform software status control-processor brief": "RP0 Healthy 3869120 2188856 (57%) 1680264 (43%)\n",
+}
+PARSED = {
+    "ios": {
+        "show version": {"platform": {"kernel_uptime": {"days": 12}}},
+        "show ip interface brief": {
+            "interface": {
+                f"Gi0/{i}": {"status": "up", "protocol": "up"} for i in range(48)
+            }
+        },
+        "sh proc cpu": {"kernel_percent": 3.0},
+    },
+    "iosxr": {"sh proc cpu": {"kernel_percent": 3.0}},
+    "nxos": {
+        "show version": {"platform": {"kernel_uptime": {"days": 12}}},
+        "show interface brief": {
+            "interface": {"ethernet": {f"Eth1/{i}": {"status": "up"} for i in range(48)}}
+        },
+        "sh proc cpu": {"kernel_percent": 3.0},
+    },
+    "iosxe": {
+        "show version": {"version": {"uptime": "2 weeks, 1 day, 3 hours"}},
+        "show ip interface brief": {
+            "interface": {
+                f"Gi1/0/{i}": {"status": "up", "protocol": "up"} for i in range(48)
+            }
+        },
+        "sh proc cpu": {"five_sec_cpu_total": 5, "one_min_cpu": 4, "five_min_cpu": 3},
+    },
+}
+
+
+class FakeDevice:
+    """Device answering from canned outputs after ``rtt`` seconds per command
+
+    Like unicon, a list of commands is sent one command at a time.
+    """
+
+    def __init__(self, name, os_name, rtt):
+        self.name = name
+        self.os = os_name
+        self.rtt = rtt
+        self.connected = True
+        self.round_trips = 0
+
+    def execute(self, command, **kwargs):
+        if isinstance(command, list):
+            return {each: self.execute(each) for each in command}
+        time.sleep(self.rtt)
+        self.round_trips += 1
+        return RAW.get(command, command)
+
+    def parse(self, command, output=None, **kwargs):
+        if output is None:
+            # parsing without an output sends the command first
+            self.execute(command)
+        return PARSED[self.os][command]
+
+
+def collect(os_name, plan, count, rtt):
+    """Collect the merged commands of the plan, once per device"""
+    devices = [FakeDevice(f"{os_name}{i}", os_name, rtt) for i in range(count)]
+    snapshot = SnapshotCache()
+    start = time.monotonic()
+    for device in devices:
+        snapshot.collect_device(device, plan.commands_for(os_name))
+    elapsed = (time.monotonic() - start) / count
+    return snapshot, devices, elapsed, devices[0].round_trips
+
+
+def collect_per_check(os_name, plan, count, rtt):
+    """Send the command of every check on its own, as the uncompiled checks did"""
+    devices = [FakeDevice(f"{os_name}{i}", os_name, rtt) for i in range(count)]
+    start = time.monotonic()
+    for device in devices:
+        for check in plan.dispatch[os_name].values():
+            check.output(device)
+    elapsed = (time.monotonic() - start) / count
+    return elapsed, devices[0].round_trips
+
+
+def evaluate(plan, snapshot, devices):
+    views = [snapshot.device(device) for device in devices]
+    for view in views:
+        for name in CHECKS:
+            check = plan.get(name, view.os)
+            if check is None:
+                continue
+            if check.compare is None:
+                check.values(view).summary(range(48))
+            else:
+                check.evaluate(view)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--devices", type=int, default=200, help="devices per OS")
+    parser.add_argument("--rtt", type=float, default=0.002, help="simulated round trip in seconds")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    compile_time = min(timeit.repeat(compile_plan, number=100, repeat=5)) / 100
+    print(f"compile_plan: {compile_time * 1e6:.1f} us")
+    plan = compile_plan()
+
+    print(f"{'os':<6} {'checks':>6} {'planned':>16} {'per check':>16} {'evaluate':>12}")
+    for os_name in sorted(plan.dispatch):
+        checks = len(plan.dispatch[os_name])
+        snapshot, devices, planned, planned_trips = collect(
+            os_name, plan, args.devices, args.rtt
+        )
+        per_check, per_check_trips = collect_per_check(os_name, plan, args.devices, args.rtt)
+        start = time.monotonic()
+        evaluate(plan, snapshot, devices)
+        evaluated = (time.monotonic() - start) / len(devices)
+        print(
+            f"{os_name:<6} {checks:>6} "
+            f"{planned * 1e3:>9.2f} ms/{planned_trips:<3} "
+            f"{per_check * 1e3:>9.2f} ms/{per_check_trips:<3} "
+            f"{evaluated * 1e6:>9.1f} us"
+        )
+    print("collect times are per device, followed by the commands sent per device")
+
+
+if __name__ == "__main__":
+    main()
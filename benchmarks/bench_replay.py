@@ -0,0 +1,80 @@
+"""
+bench_replay.py
+
+Offline parse and check throughput from a recorded output store
+
+Replays a store written with ``--record`` through the snapshot collection and
+every device check of verify_test.py, without any network, and reports where
+the time goes:
+
+    python benchmarks/bench_replay.py recorded.db --copies 100 --workers 1 8
+
+"""
+import argparse
+import functools
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import verify_test  # noqa: E402
+from checks import CHECKS, compile_plan  # noqa: E402
+from replay import OutputStore, ReplayDevice, ReplayTestbed  # noqa: E402
+from runner import run_per_device  # noqa: E402
+from snapshot import SnapshotCache  # noqa: E402
+
+
+def replay_devices(store, copies):
+    """Replay devices, each recorded device repeated ``copies`` times"""
+    devices = []
+    for device in ReplayTestbed(store).devices.values():
+        for i in range(copies):
+            copy = ReplayDevice(f"{device.name}-{i}", device.os, store, source=device.name)
+            copy.connect()
+            devices.append(copy)
+    return devices
+
+
+def bench(devices, workers):
+    timings = {}
+    plan = compile_plan()
+    snapshot = SnapshotCache()
+    start = time.monotonic()
+    snapshot.collect(devices, plan, workers=workers)
+    timings["collect"] = time.monotonic() - start
+    views = [snapshot.device(device) for device in devices]
+    for name in CHECKS:
+        if name == "updown_validation":
+            check = functools.partial(verify_test.check_updown_validation, plan=plan)
+        else:
+            check = functools.partial(verify_test.check_threshold, plan=plan, name=name)
+        start = time.monotonic()
+        run_per_device(check, views, workers)
+        timings[name] = time.monotonic() - start
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("store", help="store file written with --record")
+    parser.add_argument("--copies", type=int, default=1, help="times each recorded device is replayed")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1])
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    store = OutputStore(args.store)
+    columns = ("collect",) + CHECKS
+    print(f"{'devices':>8} {'workers':>8} " + " ".join(f"{c:>18}" for c in columns))
+    for workers in args.workers:
+        devices = replay_devices(store, args.copies)
+        timings = bench(devices, workers)
+        print(
+            f"{len(devices):>8} {workers:>8} "
+            + " ".join(f"{timings[c]:>17.3f}s" for c in columns)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+bench_scale.py
+
+Wall time, peak memory and per-test timings of the job against the device count
+
+Runs the full job once per testbed size, through scale_job.py, against
+synthetic testbeds of local mock devices spread over ios, nxos, iosxe, asa
+and fxos (see mock.py), each device answering
+after --latency seconds per command with --interfaces interfaces. Reports
+the wall time and peak RSS of every run, the job process and its tasks
+included, and the wall time of its sections, from the timing report of
+the job: loading the testbed, connecting, collecting and every test.
+
+    python benchmarks/bench_scale.py --save            # store the results of this commit
+    python benchmarks/bench_scale.py                   # compare with the last stored commit
+    python benchmarks/bench_scale.py --compare 1a2b3c4 --devices 10 100
+
+The results are stored in --history by git commit, so the runs of any two
+commits can be compared. Exits with status 1 when a wall time or peak RSS
+is worse than the compared commit by more than --tolerance. Arguments not
+known here are passed on to the job, e.g. --device-workers 8 --shards 4.
+
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+JOB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scale_job.py")
+HISTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scale_results.json")
+
+
+def commit():
+    """Short hash of the checked out commit, marked dirty with local changes"""
+    git = ["git", "-C", ROOT]
+    head = subprocess.run(
+        git + ["rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+    ).stdout.strip()
+    status = subprocess.run(
+        git + ["status", "--porcelain", "--untracked-files=no"],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return f"{head}-dirty" if status.strip() else head
+
+
+def run_job(pyats, count, latency, interfaces, job_args, directory):
+    """Run the job against ``count`` mock devices, return its measures"""
+    metrics_file = os.path.join(directory, f"metrics.{count}.json")
+    command = [pyats, "run", "job", JOB, "--no-archive"]
+    options = {
+        "--mock-devices": count,
+        "--mock-latency": latency,
+        "--mock-interfaces": interfaces,
+        "--metrics-file": metrics_file,
+        "--results-file": os.path.join(directory, f"results.{count}.jsonl"),
+    }
+    for flag, value in options.items():
+        command += [flag, str(value)]
+    command += job_args
+    log = os.path.join(directory, f"job.{count}.log")
+    with open(log, "w") as output:
+        start = time.perf_counter()
+        process = subprocess.Popen(command, cwd=directory, stdout=output, stderr=output)
+        # the resource usage of the job process includes the task processes
+        # it waited for, the peak RSS is the largest of them
+        _, status, usage = os.wait4(process.pid, 0)
+        seconds = time.perf_counter() - start
+    # already waited for, Popen must not wait again
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if not os.path.exists(metrics_file):
+        raise RuntimeError(f"the job wrote no timing report, see {log}")
+    with open(metrics_file) as f:
+        report = json.load(f)
+    return {
+        "seconds": round(seconds, 3),
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": round(usage.ru_maxrss / 1024, 1),
+        "exit_code": process.returncode,
+        "sections": report["sections"],
+        "phases": {phase: stats["sum"] for phase, stats in report["phases"].items()},
+    }
+
+
+def change(value, base):
+    return f"{value / base - 1:>+7.0%}" if base else f"{'-':>7}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--devices", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    parser.add_argument("--latency", type=float, default=0.01, help="seconds per command")
+    parser.add_argument("--interfaces", type=int, default=48, help="interfaces per device")
+    parser.add_argument("--pyats", default="pyats", help="pyats command running the job")
+    parser.add_argument("--history", default=HISTORY, help="JSON file of the stored results")
+    parser.add_argument("--save", action="store_true", help="store the results of this commit")
+    parser.add_argument(
+        "--compare", default=None, help="stored commit to compare with, the last other by default"
+    )
+    parser.add_argument(
+        "--tolerance", type=float, default=0.25, help="allowed regression, 0.25 = 25%%"
+    )
+    args, job_args = parser.parse_known_args()
+
+    history = {}
+    if os.path.exists(args.history):
+        with open(args.history) as f:
+            history = json.load(f)
+    current = commit()
+    options = {
+        "latency": args.latency,
+        "interfaces": args.interfaces,
+        "job_args": job_args,
+    }
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for count in args.devices:
+            results[str(count)] = run_job(
+                args.pyats, count, args.latency, args.interfaces, job_args, directory
+            )
+
+    others = [name for name in history if name != current]
+    base_name = args.compare or (others[-1] if others else None)
+    base = history.get(base_name, {})
+    if base_name and not base:
+        print(f"nothing stored for {base_name} in {args.history}")
+    elif base and base["options"] != options:
+        print(f"{base_name} ran with other options, {base['options']}: the timings may differ")
+    base_results = base.get("devices", {})
+
+    print(f"{current} compared with {base_name or '-'}")
+    print(f"{'devices':>8} {'wall':>10} {'change':>7} {'peak RSS':>11} {'change':>7}  exit")
+    regressed = []
+    for count, result in results.items():
+        old = base_results.get(count, {})
+        print(
+            f"{count:>8} {result['seconds']:>9.2f}s "
+            f"{change(result['seconds'], old.get('seconds'))} "
+            f"{result['peak_rss_mb']:>8.1f} MB "
+            f"{change(result['peak_rss_mb'], old.get('peak_rss_mb'))}  {result['exit_code']}"
+        )
+        for measure in ("seconds", "peak_rss_mb"):
+            if old.get(measure) and result[measure] > old[measure] * (1 + args.tolerance):
+                regressed.append(f"{measure} of {count} devices")
+
+    print()
+    print(f"{'devices':>8} {'section':<26} {'seconds':>10} {'change':>7}")
+    for count, result in results.items():
+        old = base_results.get(count, {}).get("sections", {})
+        for section, seconds in result["sections"].items():
+            print(f"{count:>8} {section:<26} {seconds:>10.3f} {change(seconds, old.get(section))}")
+
+    if args.save:
+        history[current] = {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "options": options,
+            "devices": results,
+        }
+        with open(args.history, "w") as f:
+            json.dump(history, f, indent=2)
+        print(f"results of {current} saved to {args.history}")
+    if regressed:
+        print(f"worse than {base_name} by more than {args.tolerance:.0%}: {', '.join(regressed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
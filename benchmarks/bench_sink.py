@@ -0,0 +1,140 @@
+"""
+bench_sink.py
+
+Memory and output size of the check results against the device count
+
+Collects and checks mock testbeds of growing size in two ways and reports
+the memory allocated (tracemalloc) and the bytes written. The memory held
+by the collected snapshot, the same in both modes, is reported on its own
+next to the peak of the whole run, collection included:
+
+* pprint: every result held until all devices are checked, then replayed
+  into the log, with the interface table of every device pprinted
+  (--interface-detail), as before the result sink
+* sink: runner.run_steps with per-interface summaries, replaying a
+  chunk of devices at a time, and one JSON Lines record per device and
+  check in a results.jsonl file
+
+    python benchmarks/bench_sink.py --devices 100 1000 5000 --interfaces 48
+
+"""
+import argparse
+import contextlib
+import functools
+import logging
+import os
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import verify_test  # noqa: E402
+from checks import CHECKS, compile_plan  # noqa: E402
+from deadline import Deadlines  # noqa: E402
+from metrics import Metrics  # noqa: E402
+from mock import make_testbed  # noqa: E402
+from runner import StepFailed, run_per_device, run_steps  # noqa: E402
+from sink import ResultSink  # noqa: E402
+from snapshot import SnapshotCache  # noqa: E402
+
+
+class Step:
+    """Just enough of a pyATS step to replay results into"""
+
+    def start(self, name, continue_=False):
+        return Step()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return exc_type is None or issubclass(exc_type, Exception)
+
+    def failed(self, reason=None):
+        raise StepFailed(reason)
+
+    skipped = failed
+
+
+def checks(plan, detail):
+    for name in CHECKS:
+        if name == "updown_validation":
+            yield name, functools.partial(
+                verify_test.check_updown_validation, plan=plan, detail=detail
+            )
+        else:
+            yield name, functools.partial(verify_test.check_threshold, plan=plan, name=name)
+
+
+def run_pprint(testbed, plan, snapshot, directory):
+    devices = [snapshot.device(device) for device in testbed]
+    for name, check in checks(plan, detail=True):
+        results = run_per_device(check, devices)
+        for result in results.values():
+            result.replay(Step())
+
+
+def run_sink(testbed, plan, snapshot, directory):
+    sink = ResultSink(os.path.join(directory, "results.jsonl"))
+    metrics, deadlines = Metrics(), Deadlines()
+    for name, check in checks(plan, detail=False):
+        run_steps(
+            Step(), testbed, "{}", check, snapshot, 1, plan, metrics, deadlines, None, sink, name
+        )
+    sink.close()
+
+
+def measure(run, count, interfaces):
+    testbed = make_testbed(count, interfaces=interfaces)
+    for device in testbed:
+        device.connected = True
+    plan = compile_plan()
+    with tempfile.TemporaryDirectory() as directory:
+        log = os.path.join(directory, "job.log")
+        handler = logging.FileHandler(log)
+        logging.getLogger().addHandler(handler)
+        try:
+            with open(os.path.join(directory, "stdout.log"), "w") as stdout:
+                with contextlib.redirect_stdout(stdout):
+                    tracemalloc.start()
+                    snapshot = SnapshotCache()
+                    snapshot.collect(testbed.devices.values(), plan)
+                    held = tracemalloc.get_traced_memory()[0]
+                    run(testbed, plan, snapshot, directory)
+                    peak = tracemalloc.get_traced_memory()[1]
+                    tracemalloc.stop()
+        finally:
+            logging.getLogger().removeHandler(handler)
+            handler.close()
+        sizes = {
+            name: os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory)
+        }
+    log_bytes = sizes.get("job.log", 0) + sizes.get("stdout.log", 0)
+    return held, peak, log_bytes, sizes.get("results.jsonl", 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--devices", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--interfaces", type=int, default=48, help="interfaces per device")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.INFO)
+    # keep the benchmark's own output readable
+    logging.getLogger().handlers = []
+    print(
+        f"{'devices':>8} {'mode':<7} {'snapshot':>12} {'peak memory':>12} "
+        f"{'log':>12} {'results':>12}"
+    )
+    for count in args.devices:
+        for mode, run in (("pprint", run_pprint), ("sink", run_sink)):
+            held, peak, log_bytes, results_bytes = measure(run, count, args.interfaces)
+            print(
+                f"{count:>8} {mode:<7} {held / 2**20:>9.1f} MB {peak / 2**20:>9.1f} MB "
+                f"{log_bytes / 2**20:>9.1f} MB {results_bytes / 2**20:>9.1f} MB"
+            )
+
+
+if __name__ == "__main__":
+    main()
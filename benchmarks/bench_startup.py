@@ -0,0 +1,138 @@
+"""
+bench_startup.py
+
+Job startup time, tracked against a stored baseline
+
+Imports verify_test in fresh interpreters, the way every easypy task does,
+and reports the median import time and the slowest modules it imports (from
+``python -X importtime``). With --testbed it also times loading the testbed
+and compiling the check plan for its OSes, with the Genie conversion only
+when the plan parses anything, as CommonSetup.load_testbed does.
+
+    python benchmarks/bench_startup.py --save        # record the baseline
+    python benchmarks/bench_startup.py               # compare with it
+
+Exits with status 1 when a median is slower than the baseline by more than
+--tolerance.
+
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "startup_baseline.json")
+
+IMPORT = """
+import time
+start = time.perf_counter()
+import verify_test
+print(time.perf_counter() - start)
+"""
+
+LOAD = """
+import sys, time
+start = time.perf_counter()
+from pyats.topology import loader
+from checks import compile_plan
+testbed = loader.load(sys.argv[1])
+plan = compile_plan(os_names={device.os for device in testbed.devices.values()})
+if plan.parses():
+    from genie.testbed import load
+    testbed = load(testbed)
+print(time.perf_counter() - start)
+"""
+
+
+def run(code, *args, flags=()):
+    """Run code in a fresh interpreter from the repository, return its stdout and stderr"""
+    path = os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")]))
+    env = dict(os.environ, PYTHONPATH=path)
+    result = subprocess.run(
+        [sys.executable, *flags, "-c", code, *args],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return result.stdout, result.stderr
+
+
+def median_seconds(code, *args, repeat=5):
+    return statistics.median(float(run(code, *args)[0]) for _ in range(repeat))
+
+
+def slowest_imports(top):
+    """Modules imported by verify_test itself, by cumulative import time"""
+    _, stderr = run("import verify_test", flags=("-X", "importtime"))
+    imports = []
+    for line in stderr.splitlines():
+        # import time: self [us] | cumulative | imported package, indented by
+        # two spaces per nesting level, children listed before their parent
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        if level == 1:
+            imports.append((name.strip(), int(cumulative)))
+        elif level == 0:
+            if name.strip() == "verify_test":
+                break
+            imports = []
+    return sorted(imports, key=lambda item: item[1], reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per measure")
+    parser.add_argument("--testbed", default=None, help="also time loading this testbed YAML")
+    parser.add_argument("--top", type=int, default=10, help="slowest imports listed")
+    parser.add_argument("--baseline", default=BASELINE, help="baseline JSON file")
+    parser.add_argument("--save", action="store_true", help="store the results as the baseline")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.25, help="allowed slowdown over the baseline, 0.25 = 25%%"
+    )
+    args = parser.parse_args()
+
+    results = {"import": median_seconds(IMPORT, repeat=args.repeat)}
+    if args.testbed:
+        results["load_testbed"] = median_seconds(LOAD, args.testbed, repeat=args.repeat)
+
+    print(f"{'module':<40} {'cumulative':>12}")
+    for name, microseconds in slowest_imports(args.top):
+        print(f"{name:<40} {microseconds / 1e3:>9.1f} ms")
+    print()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regressed = []
+    print(f"{'measure':<14} {'median':>10} {'baseline':>10} {'change':>8}")
+    for name, seconds in results.items():
+        base = baseline.get(name)
+        if base:
+            change = seconds / base - 1
+            print(f"{name:<14} {seconds * 1e3:>7.1f} ms {base * 1e3:>7.1f} ms {change:>+7.0%}")
+            if change > args.tolerance:
+                regressed.append(name)
+        else:
+            print(f"{name:<14} {seconds * 1e3:>7.1f} ms {'-':>10} {'-':>8}")
+
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"baseline saved to {args.baseline}")
+    elif regressed:
+        print(f"slower than the baseline by more than {args.tolerance:.0%}: {', '.join(regressed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
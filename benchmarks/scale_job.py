@@ -0,0 +1,35 @@
+"""
+scale_job.py
+
+network_test_job.py against a synthetic testbed of local mock devices
+
+Job file of bench_scale.py: builds a testbed of --mock-devices devices with
+mock.make_testbed, spread over ios, nxos, iosxe, asa and fxos, and runs
+network_test_job.py against it. Every other argument is a job argument.
+
+    pyats run job benchmarks/scale_job.py --mock-devices 1000 --mock-latency 0.01
+
+"""
+import argparse
+import os
+import sys
+
+# make the modules of the job importable
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import network_test_job  # noqa: E402
+from mock import make_testbed  # noqa: E402
+
+parser = argparse.ArgumentParser(description="mock testbed arguments")
+parser.add_argument("--mock-devices", type=int, default=100, help="mock devices")
+parser.add_argument("--mock-latency", type=float, default=0.0, help="seconds per command")
+parser.add_argument("--mock-interfaces", type=int, default=8, help="interfaces per device")
+
+
+def main(runtime):
+    """job file entrypoint"""
+    args = parser.parse_known_args()[0]
+    testbed = make_testbed(
+        args.mock_devices, latency=args.mock_latency, interfaces=args.mock_interfaces
+    )
+    network_test_job.main(runtime, testbed=testbed)
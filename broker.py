@@ -0,0 +1,428 @@
+"""
+broker.py
+
+Local session broker keeping device sessions warm between job runs
+
+The broker is a separate, long-running process holding authenticated
+sessions to the devices of a testbed. verify_test.py sends it the commands
+over a local Unix socket instead of logging into every device again, and
+parses the outputs itself. Sessions are opened on first use, health
+checked and evicted when idle, and their number is capped; the least
+recently used idle session makes room for a new one.
+
+    python broker.py --testbed testbed.yaml --max-sessions 500 --idle-timeout 900
+    pyats run job network_test_job.py --testbed-file testbed.yaml --broker
+
+When the broker is not running the job connects directly, as without it.
+Requests and responses are JSON, one per line.
+
+The socket lives in a directory only the user running the broker can
+enter, $XDG_RUNTIME_DIR or a private directory under the temporary
+directory, and clients only trust a socket owned by their own user: the
+sessions are authenticated, and their outputs decide the verdicts.
+
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import socket
+import socketserver
+import tempfile
+import threading
+import time
+
+from connection import connect_device
+
+# create a logger for this module
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET = os.path.join(
+    os.environ.get("XDG_RUNTIME_DIR")
+    or os.path.join(tempfile.gettempdir(), f"network-test-broker-{os.getuid()}"),
+    "network-test-broker.sock",
+)
+
+
+class BrokerError(Exception):
+    """The broker could not serve a request"""
+
+
+class Session:
+    """Warm session of one device, used by one request at a time"""
+
+    __slots__ = ("device", "lock", "last_used")
+
+    def __init__(self, device):
+        self.device = device
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+
+
+class Broker:
+    """Pool of at most ``max_sessions`` device sessions"""
+
+    def __init__(
+        self, testbed, max_sessions=100, idle_timeout=900, health_interval=60, connect_timeout=60
+    ):
+        self.testbed = testbed
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.health_interval = health_interval
+        self.connect_timeout = connect_timeout
+        self.sessions = {}
+        # sessions taken out of the pool, logging out
+        self._closing = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def handle(self, request):
+        op = request.get("op")
+        if op == "ping":
+            return {"sessions": len(self.sessions), "max_sessions": self.max_sessions}
+        if op == "connect":
+            with self.using(request["device"], request.get("timeout")):
+                return None
+        if op == "execute":
+            return self.execute(request["device"], request["command"], request.get("timeout"))
+        if op == "status":
+            now = time.monotonic()
+            return {name: round(now - s.last_used, 1) for name, s in list(self.sessions.items())}
+        raise BrokerError(f"unknown request {op!r}")
+
+    @contextlib.contextmanager
+    def using(self, name, timeout=None):
+        """Hold the connected session of a device, opened if needed"""
+        while True:
+            evicted = None
+            with self._lock:
+                session = self.sessions.get(name)
+                closing = self._closing.get(name)
+                if session is None and closing is None:
+                    if name not in self.testbed.devices:
+                        raise BrokerError(f"{name} is not in the broker testbed")
+                    if len(self.sessions) >= self.max_sessions:
+                        evicted = self._evict_least_recent()
+                    session = self.sessions[name] = Session(self.testbed.devices[name])
+            if evicted is not None:
+                try:
+                    self._close(*evicted, "to make room")
+                finally:
+                    evicted[1].lock.release()
+            if session is None:
+                # the previous session of the device is logging out
+                with closing.lock:
+                    continue
+            session.lock.acquire()
+            if self.sessions.get(name) is session:
+                break
+            # evicted while waiting for it
+            session.lock.release()
+        try:
+            if not session.device.connected:
+                status = connect_device(session.device, timeout or self.connect_timeout, retries=0)
+                if not status.connected:
+                    with self._lock:
+                        self.sessions.pop(name, None)
+                    raise BrokerError(f"{name} could not connect: {status.error}")
+                logger.info(f"{name} session opened in {status.duration:.1f}s")
+            yield session
+            session.last_used = time.monotonic()
+        finally:
+            session.lock.release()
+
+    def _evict_least_recent(self):
+        # called with self._lock held, returns the least recently used idle
+        # session taken out of the pool and still locked, for _close()
+        for name, session in sorted(self.sessions.items(), key=lambda item: item[1].last_used):
+            if session.lock.acquire(blocking=False):
+                self._take(name, session)
+                return name, session
+        raise BrokerError(f"all {self.max_sessions} sessions are busy")
+
+    def _take(self, name, session):
+        # called with self._lock and session.lock held: the device gets no
+        # new session until _close() is done with this one
+        del self.sessions[name]
+        self._closing[name] = session
+
+    def _close(self, name, session, why):
+        """Disconnect a session taken out of the pool
+
+        Called with the session lock held but not the pool lock, so a slow
+        logout only holds up the requests for this device.
+        """
+        try:
+            session.device.disconnect()
+        except Exception as e:
+            logger.warning(f"{name} did not disconnect cleanly: {e}")
+        finally:
+            with self._lock:
+                self._closing.pop(name, None)
+        logger.info(f"{name} session closed {why}")
+
+    def execute(self, name, command, timeout=None):
+        with self.using(name, timeout) as session:
+            kwargs = {"timeout": timeout} if timeout else {}
+            try:
+                return session.device.execute(command, **kwargs)
+            except Exception:
+                # a session failing a command is not trusted again
+                with self._lock:
+                    self._take(name, session)
+                self._close(name, session, "after a failed command")
+                raise
+
+    def maintain(self):
+        """Sweep the sessions every health_interval"""
+        while not self._stop.wait(self.health_interval):
+            self.sweep()
+
+    def sweep(self):
+        """Close the idle sessions and the dead ones"""
+        now = time.monotonic()
+        with self._lock:
+            sessions = list(self.sessions.items())
+        for name, session in sessions:
+            if not session.lock.acquire(blocking=False):
+                continue
+            try:
+                if now - session.last_used > self.idle_timeout:
+                    why = "when idle"
+                elif not _alive(session.device):
+                    why = "after failing its health check"
+                else:
+                    continue
+                with self._lock:
+                    if self.sessions.get(name) is not session:
+                        continue
+                    self._take(name, session)
+                self._close(name, session, why)
+            finally:
+                session.lock.release()
+
+    def serve(self, path=DEFAULT_SOCKET):
+        """Serve requests on a Unix socket until interrupted
+
+        Raises BrokerError when a broker already serves on the socket, or
+        when its directory can be entered by other users.
+        """
+        _private_directory(os.path.dirname(os.path.abspath(path)))
+        if os.path.exists(path):
+            if BrokerClient(path).available():
+                raise BrokerError(f"a broker already serves on {path}")
+            # left over by a broker which did not shut down cleanly
+            os.unlink(path)
+        server = _Server(path, _Handler)
+        server.broker = self
+        # the sessions are authenticated: only this user may use them
+        os.chmod(path, 0o600)
+        threading.Thread(target=self.maintain, name="broker-maintain", daemon=True).start()
+        logger.info(f"Broker serving {len(self.testbed.devices)} device(s) on {path}")
+        try:
+            server.serve_forever()
+        finally:
+            self.close()
+            server.server_close()
+            os.unlink(path)
+
+    def close(self):
+        """Close every session, each once its running request is done"""
+        self._stop.set()
+        with self._lock:
+            sessions = list(self.sessions.items())
+        for name, session in sessions:
+            with session.lock:
+                with self._lock:
+                    if self.sessions.get(name) is not session:
+                        continue
+                    self._take(name, session)
+                self._close(name, session, "on shutdown")
+
+
+def _private_directory(path):
+    """Create the socket directory, or check that only this user can enter it"""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.stat(path)
+    if info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise BrokerError(
+            f"{path} is not private to this user, use a socket in a directory with mode 0700"
+        )
+
+
+def _alive(device):
+    is_connected = getattr(device, "is_connected", None)
+    try:
+        return is_connected() if callable(is_connected) else bool(device.connected)
+    except Exception:
+        return False
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                response = {"ok": True, "result": self.server.broker.handle(json.loads(line))}
+            except Exception as e:
+                response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+
+
+class BrokerClient:
+    """Client side of the broker socket, one short connection per request"""
+
+    def __init__(self, path=DEFAULT_SOCKET):
+        self.path = path
+
+    def request(self, op, **args):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(self.path)
+            with sock.makefile("rwb") as stream:
+                stream.write(json.dumps(dict(args, op=op)).encode() + b"\n")
+                stream.flush()
+                line = stream.readline()
+        if not line:
+            raise BrokerError("the broker closed the connection")
+        response = json.loads(line)
+        if not response["ok"]:
+            raise BrokerError(response["error"])
+        return response["result"]
+
+    def available(self):
+        """Whether a broker of this user answers on the socket
+
+        A socket owned by anybody else is never trusted: it could serve
+        forged outputs, or collect the commands sent.
+        """
+        try:
+            owner = os.stat(self.path).st_uid
+        except OSError:
+            return False
+        if owner != os.getuid():
+            logger.error(f"Not using the broker socket {self.path}, owned by user {owner}")
+            return False
+        try:
+            self.request("ping")
+        except (OSError, ValueError, BrokerError):
+            return False
+        return True
+
+    def testbed(self, testbed):
+        return BrokerTestbed(testbed, self)
+
+
+class BrokeredDevice:
+    """Device sending its commands through the broker's warm session
+
+    Outputs are parsed locally by the testbed device, from the raw output.
+    If the broker cannot open a session for it, the device connects
+    directly and is used as without a broker.
+    """
+
+    def __init__(self, device, client):
+        self._device = device
+        self._client = client
+        self._direct = False
+        self.connected = False
+
+    def __getattr__(self, name):
+        return getattr(self._device, name)
+
+    def connect(self, connection_timeout=None, **kwargs):
+        try:
+            self._client.request("connect", device=self._device.name, timeout=connection_timeout)
+        except (OSError, ValueError, BrokerError) as e:
+            logger.warning(f"{self._device.name}, no broker session, connecting directly: {e}")
+            self._direct = True
+            kwargs["connection_timeout"] = connection_timeout
+            self._device.connect(**kwargs)
+        self.connected = True
+
+    def disconnect(self):
+        # the broker session stays warm for the next run
+        if self._direct:
+            self._device.disconnect()
+        self.connected = False
+
+    def destroy(self):
+        if self._direct:
+            self._device.destroy()
+        self.connected = False
+
+    def execute(self, command, timeout=None, **kwargs):
+        if self._direct:
+            if timeout is not None:
+                kwargs["timeout"] = timeout
+            return self._device.execute(command, **kwargs)
+        return self._client.request(
+            "execute", device=self._device.name, command=command, timeout=timeout
+        )
+
+    def parse(self, command, output=None, **kwargs):
+        if output is None:
+            output = self.execute(command)
+        return self._device.parse(command, output=output, **kwargs)
+
+
+class BrokerTestbed:
+    """Testbed whose devices go through the broker"""
+
+    def __init__(self, testbed, client):
+        self.name = testbed.name
+        self.devices = {
+            name: BrokeredDevice(device, client) for name, device in testbed.devices.items()
+        }
+
+    def __iter__(self):
+        return iter(self.devices.values())
+
+    def __len__(self):
+        return len(self.devices)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="warm device session broker")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--testbed", help="testbed YAML file")
+    source.add_argument("--mock", type=int, help="serve this many mock devices instead")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="Unix socket path")
+    parser.add_argument("--max-sessions", type=int, default=100, help="sessions kept at most")
+    parser.add_argument(
+        "--idle-timeout", type=float, default=900, help="seconds an unused session is kept"
+    )
+    parser.add_argument(
+        "--health-interval", type=float, default=60, help="seconds between health checks"
+    )
+    parser.add_argument("--connect-timeout", type=int, default=60, help="seconds per login")
+    parser.add_argument(
+        "--mock-connect-latency", type=float, default=1.0, help="login seconds of mock devices"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if args.mock:
+        from mock import make_testbed
+
+        testbed = make_testbed(args.mock, connect_latency=args.mock_connect_latency)
+    else:
+        from pyats.topology import loader
+
+        testbed = loader.load(args.testbed)
+    broker = Broker(
+        testbed, args.max_sessions, args.idle_timeout, args.health_interval, args.connect_timeout
+    )
+    try:
+        broker.serve(args.socket)
+    except BrokerError as e:
+        parser.exit(1, f"{e}\n")
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+"""
+checks.py
+
+Declarative check plan compiled into a per-OS dispatch table
+
+Every check is described once in SPEC (or a YAML file with the same layout):
+for each device OS the command to send, whether to parse it with Genie and
+the extractor reducing the output to values, plus the threshold and the
+comparison those values must satisfy. compile_plan() validates the spec and
+turns it into a Plan keyed by exact OS name, which also knows the merged,
+de-duplicated command set of every OS so each command is sent once per
+device.
+
+"""
+import operator
+import re
+
+import interfaces
+import parsers
+
+# check name -> settings shared by every OS, and the per-OS entries under
+# "os". A per-OS entry may override "threshold" and "compare".
+SPEC = {
+    "last_reload": {
+        "compare": "gt",
+        "threshold": 1,
+        "passed": "There was no reload within 1 day",
+        "failed": "There was recent reload within 1 day",
+        "os": {
+            "ios": {"command": "show version", "parse": True, "extract": "kernel_uptime_days"},
+            "nxos": {"command": "show version", "parse": True, "extract": "kernel_uptime_days"},
+            "iosxe": {"command": "show version", "parse": True, "extract": "version_uptime_days"},
+            "asa": {"command": "show version", "extract": "fast_path"},
+            "fxos": {"command": "show version system", "extract": "fast_path"},
+        },
+    },
+    "updown_validation": {
+        "os": {
+            "ios": {
+                "command": "show ip interface brief",
+                "parse": True,
+                "extract": "ip_interface_brief_table",
+            },
+            "iosxe": {
+                "command": "show ip interface brief",
+                "parse": True,
+                "extract": "ip_interface_brief_table",
+            },
+            "nxos": {
+                "command": "show interface brief",
+                "parse": True,
+                "extract": "nxos_interface_brief_table",
+            },
+            "asa": {"command": "show interface ip brief", "extract": "interface_brief_table"},
+            "fxos": {"command": "show interface ip brief", "extract": "interface_brief_table"},
+        },
+    },
+    "cpu_util": {
+        "compare": "lt",
+        "threshold": 40.0,
+        "passed": "cpu_util is good",
+        "failed": "cpu_util is bad",
+        "os": {
+            "ios": {"command": "sh proc cpu", "parse": True, "extract": "kernel_percent"},
+            "iosxr": {"command": "sh proc cpu", "parse": True, "extract": "kernel_percent"},
+            "nxos": {"command": "sh proc cpu", "parse": True, "extract": "kernel_percent"},
+            "iosxe": {"command": "sh proc cpu", "parse": True, "extract": "cpu_totals"},
+            "asa": {"command": "show cpu usage", "extract": "fast_path"},
+            "fxos": {"command": "show cpu", "extract": "fast_path"},
+        },
+    },
+    "memory_util": {
+        "compare": "lt",
+        "threshold": 80.0,
+        "passed": "memory_util is good",
+        "failed": "memory_util is bad",
+        "os": {
+            "ios": {"command": "show system resource", "extract": "memory_usage_percent"},
+            "iosxr": {"command": "show system resource", "extract": "memory_usage_percent"},
+            "nxos": {"command": "show system resource", "extract": "memory_usage_percent"},
+            "iosxe": {
+                "command": "show platform software status control-processor brief",
+                "extract": "first_percent",
+            },
+            "asa": {"command": "show memory", "extract": "fast_path"},
+            "fxos": {"command": "show memory", "extract": "fast_path"},
+        },
+    },
+}
+
+CHECKS = tuple(SPEC)
+
+COMPARE = {
+    "lt": operator.lt,
+    "le": operator.le,
+    "gt": operator.gt,
+    "ge": operator.ge,
+    "eq": operator.eq,
+    "ne": operator.ne,
+}
+
+_MEMORY_USAGE = re.compile(r"Memory usage:\D*(\d+)\D+?(\d+)")
+_FIRST_PERCENT = re.compile(r"(\d+)%")
+_FAST_PATH_LABELS = {
+    parsers.uptime: "uptime days",
+    parsers.cpu_percentages: "cpu",
+    parsers.used_memory_percent: "used %",
+}
+
+
+# Extractors reduce a (parsed or raw) output to a list of (label, value)
+# tuples, except the interface ones which return an InterfaceTable. They get
+# the device OS and command for the fast-path parsers.
+
+
+def kernel_uptime_days(output, os_name, command):
+    return [("uptime days", output["platform"]["kernel_uptime"]["days"])]
+
+
+def version_uptime_days(output, os_name, command):
+    return [("uptime days", round(parsers.uptime_days(output["version"]["uptime"]), 2))]
+
+
+def kernel_percent(output, os_name, command):
+    return [("kernel", float(output["kernel_percent"]))]
+
+
+def cpu_totals(output, os_name, command):
+    return [
+        ("5 sec", float(output["five_sec_cpu_total"])),
+        ("1 min", float(output["one_min_cpu"])),
+        ("5 min", float(output["five_min_cpu"])),
+    ]
+
+
+def memory_usage_percent(output, os_name, command):
+    match = _MEMORY_USAGE.search(output)
+    if match is None:
+        raise parsers.ParserError("no 'Memory usage' line in output")
+    total, used = float(match.group(1)), float(match.group(2))
+    return [("used %", round(used / total * 100, 2))]
+
+
+def first_percent(output, os_name, command):
+    match = _FIRST_PERCENT.search(output)
+    if match is None:
+        raise parsers.ParserError("no percentage in output")
+    return [("used %", float(match.group(1)))]
+
+
+def fast_path(output, os_name, command):
+    value = parsers.parse(os_name, command, output)
+    label = _FAST_PATH_LABELS.get(parsers.PARSERS[os_name][command], command)
+    if isinstance(value, list):
+        return [(f"{label} #{index}", v) for index, v in enumerate(value)]
+    return [(label, round(value, 2))]
+
+
+def ip_interface_brief_table(output, os_name, command):
+    return interfaces.from_ip_interface_brief(output)
+
+
+def nxos_interface_brief_table(output, os_name, command):
+    return interfaces.from_nxos_interface_brief(output)
+
+
+def interface_brief_table(output, os_name, command):
+    return interfaces.from_interface_brief_rows(parsers.parse(os_name, command, output))
+
+
+EXTRACTORS = {
+    extractor.__name__: extractor
+    for extractor in (
+        kernel_uptime_days,
+        version_uptime_days,
+        kernel_percent,
+        cpu_totals,
+        memory_usage_percent,
+        first_percent,
+        fast_path,
+        ip_interface_brief_table,
+        nxos_interface_brief_table,
+        interface_brief_table,
+    )
+}
+
+
+class CompiledCheck:
+    """One check for one OS, with its extractor and comparison resolved"""
+
+    __slots__ = (
+        "name", "os", "command", "parse", "extract", "compare", "threshold", "passed", "failed"
+    )
+
+    def __init__(self, name, os_name, command, parse, extract, compare, threshold, passed, failed):
+        self.name = name
+        self.os = os_name
+        self.command = command
+        self.parse = parse
+        self.extract = extract
+        self.compare = compare
+        self.threshold = threshold
+        self.passed = passed
+        self.failed = failed
+
+    def output(self, device):
+        """Output of the check command, parsed if the check needs it"""
+        if self.parse:
+            return device.parse(self.command)
+        return device.execute(self.command)
+
+    def values(self, device):
+        """Extracted values of a device"""
+        return self.extract(self.output(device), self.os, self.command)
+
+    def evaluate(self, device):
+        """List of (label, value, passed) tuples of a device"""
+        return [
+            (label, value, self.compare(value, self.threshold))
+            for label, value in self.values(device)
+        ]
+
+
+class Plan:
+    """Compiled checks: dispatch[os][check] and the merged commands per OS"""
+
+    def __init__(self, dispatch):
+        self.dispatch = dispatch
+        # command -> whether any check parses it, per OS, in first-use order
+        self.commands = {}
+        for os_name, checks in dispatch.items():
+            commands = self.commands.setdefault(os_name, {})
+            for check in checks.values():
+                commands[check.command] = commands.get(check.command, False) or check.parse
+
+    def get(self, check, os_name):
+        """CompiledCheck of a check for an OS, or None if it does not apply"""
+        return self.dispatch.get(os_name, {}).get(check)
+
+    def commands_for(self, os_name):
+        return self.commands.get(os_name, {})
+
+    def parses(self):
+        """Whether any planned command is parsed with Genie"""
+        return any(any(commands.values()) for commands in self.commands.values())
+
+
+def load_spec(path=None):
+    """SPEC, or the spec read from a YAML file"""
+    if path is None:
+        return SPEC
+    import yaml
+
+    with open(path) as f:
+        return yaml.safe_load(f)
+
+
+def compile_plan(spec=SPEC, checks=CHECKS, os_names=None):
+    """Compile the enabled checks of a spec into a Plan
+
+    With ``os_names`` only the entries of those OSes are compiled, e.g. the
+    OSes present in the testbed. Raises ValueError on unknown checks,
+    extractors or comparisons, so a bad spec fails before any device is
+    touched.
+    """
+    dispatch = {}
+    for name in checks:
+        if name not in spec:
+            raise ValueError(f"check {name!r} is not in the check spec")
+        settings = spec[name]
+        for os_name, entry in settings["os"].items():
+            if os_names is not None and os_name not in os_names:
+                continue
+            entry = dict(settings, **entry)
+            extract = EXTRACTORS.get(entry["extract"])
+            if extract is None:
+                raise ValueError(f"{name}/{os_name}: unknown extractor {entry['extract']!r}")
+            compare = entry.get("compare")
+            if compare is not None:
+                if compare not in COMPARE:
+                    raise ValueError(f"{name}/{os_name}: unknown comparison {compare!r}")
+                compare = COMPARE[compare]
+            dispatch.setdefault(os_name, {})[name] = CompiledCheck(
+                name,
+                os_name,
+                entry["command"],
+                bool(entry.get("parse", False)),
+                extract,
+                compare,
+                entry.get("threshold"),
+                entry.get("passed", f"{name} passed"),
+                entry.get("failed", f"{name} failed"),
+            )
+    return Plan(dispatch)
@@ -0,0 +1,87 @@
+"""
+connection.py
+
+Bounded-concurrency device connection used by CommonSetup.connect
+
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# create a logger for this module
+logger = logging.getLogger(__name__)
+
+
+class ConnectStatus:
+    """Connect outcome of a single device
+
+    Stored per device name in the ``connect_status`` script parameter so the
+    testcases can skip devices that never came up instead of waiting on them
+    again.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.connected = False
+        self.attempts = 0
+        self.duration = 0.0
+        self.error = None
+
+    @property
+    def status(self):
+        return "connected" if self.connected else "failed"
+
+    def __repr__(self):
+        return (
+            f"ConnectStatus({self.name!r}, status={self.status!r}, "
+            f"attempts={self.attempts}, duration={self.duration:.2f}s)"
+        )
+
+
+def connect_device(device, timeout=60, retries=2, backoff=2.0):
+    """Connect a single device, retrying with exponential backoff
+
+    Never raises: the outcome is returned as a ConnectStatus so one bad device
+    cannot end the connect phase for the rest of the testbed.
+    """
+    status = ConnectStatus(device.name)
+    start = time.monotonic()
+    for attempt in range(retries + 1):
+        status.attempts = attempt + 1
+        try:
+            device.connect(connection_timeout=timeout, log_stdout=False)
+        except Exception as e:
+            status.error = f"{type(e).__name__}: {e}"
+            logger.warning(
+                f"{device.name}, connect attempt {status.attempts} failed: {status.error}"
+            )
+            # Drop the half-open connection so the next attempt starts clean
+            try:
+                device.destroy()
+            except Exception:
+                pass
+            if attempt < retries:
+                time.sleep(backoff * 2 ** attempt)
+        else:
+            status.connected = True
+            status.error = None
+            break
+    status.duration = time.monotonic() - start
+    return status
+
+
+def connect_devices(devices, workers=32, timeout=60, retries=2, backoff=2.0):
+    """Connect devices concurrently with at most ``workers`` in flight
+
+    Returns a dict of device name to ConnectStatus, in the order the devices
+    were given.
+    """
+    devices = list(devices)
+    if not devices:
+        return {}
+    workers = max(1, min(workers, len(devices)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="connect") as pool:
+        results = pool.map(
+            lambda device: connect_device(device, timeout, retries, backoff), devices
+        )
+        return {status.name: status for status in results}
@@ -0,0 +1,155 @@
+"""
+deadline.py
+
+Job time budget and adaptive per-device deadlines
+
+Every device call made through a DeadlineDevice gets a deadline derived
+from the latency the device has shown so far in the run: ``factor`` times
+its average seconds per command, never less than ``min_timeout``, never
+more than ``max_timeout`` nor the time left in the job budget. The call runs
+in a daemon thread so a hung device cannot hold up the caller past its
+deadline: the straggler is abandoned, the device is marked timed out and
+every later call and test skips it instead of stalling again.
+
+"""
+import logging
+import threading
+import time
+
+# create a logger for this module
+logger = logging.getLogger(__name__)
+
+
+class DeadlineExceeded(Exception):
+    """A device missed its deadline, or the job ran out of time"""
+
+
+class Deadlines:
+    """Job budget, observed device latency and timed out devices
+
+    With neither a ``budget`` nor a ``max_timeout`` nothing ever times out,
+    but the latency is still observed.
+    """
+
+    def __init__(
+        self, budget=None, max_timeout=None, min_timeout=10.0, factor=5.0, smoothing=0.3
+    ):
+        self.start = time.monotonic()
+        self.budget = budget
+        self.max_timeout = max_timeout
+        self.min_timeout = min_timeout
+        self.factor = factor
+        self.smoothing = smoothing
+        # device name -> smoothed seconds per command
+        self.latency = {}
+        # device name -> why it was given up on
+        self.timed_out = {}
+        self._timed = {}
+
+    def remaining(self):
+        """Seconds left in the job budget, or None without a budget"""
+        if self.budget is None:
+            return None
+        return max(0.0, self.budget - (time.monotonic() - self.start))
+
+    def observe(self, name, seconds, commands=1):
+        per_command = seconds / max(1, commands)
+        previous = self.latency.get(name)
+        if previous is None:
+            self.latency[name] = per_command
+        else:
+            self.latency[name] = previous + self.smoothing * (per_command - previous)
+
+    def timeout(self, name, commands=1):
+        """Deadline in seconds of a call sending ``commands`` commands, or None"""
+        timeout = self.max_timeout
+        latency = self.latency.get(name)
+        if timeout is not None and latency is not None:
+            adaptive = max(self.min_timeout, self.factor * latency * commands)
+            timeout = min(timeout, adaptive)
+        remaining = self.remaining()
+        if remaining is not None:
+            timeout = remaining if timeout is None else min(timeout, remaining)
+        return timeout
+
+    def expire(self, name, reason):
+        if name not in self.timed_out:
+            self.timed_out[name] = reason
+            logger.error(f"{name} timed out: {reason}, skipped from now on")
+
+    def check(self, name):
+        """Raise DeadlineExceeded if the device, or the job, is out of time"""
+        if name in self.timed_out:
+            raise DeadlineExceeded(f"{name} timed out: {self.timed_out[name]}")
+        if self.remaining() == 0.0:
+            self.expire(name, f"job budget of {self.budget}s exhausted")
+            raise DeadlineExceeded(f"{name} timed out: {self.timed_out[name]}")
+
+    def call(self, name, function, commands=1):
+        """Run ``function()`` for a device within its deadline
+
+        Raises DeadlineExceeded, and marks the device timed out, when the
+        deadline passes first.
+        """
+        self.check(name)
+        timeout = self.timeout(name, commands)
+        start = time.monotonic()
+        if timeout is None:
+            result = function()
+        else:
+            done = threading.Event()
+            outcome = {}
+
+            def target():
+                try:
+                    outcome["result"] = function()
+                except BaseException as e:
+                    outcome["error"] = e
+                finally:
+                    done.set()
+
+            threading.Thread(target=target, name=f"deadline-{name}", daemon=True).start()
+            if not done.wait(timeout):
+                self.expire(name, f"no answer within {timeout:.1f}s")
+                raise DeadlineExceeded(f"{name} timed out: {self.timed_out[name]}")
+            if "error" in outcome:
+                raise outcome["error"]
+            result = outcome["result"]
+        self.observe(name, time.monotonic() - start, commands)
+        return result
+
+    def device(self, device):
+        """DeadlineDevice for a device, one per device name"""
+        if device.name not in self._timed:
+            self._timed[device.name] = DeadlineDevice(device, self)
+        return self._timed[device.name]
+
+
+class DeadlineDevice:
+    """Device wrapper running every command within the device's deadline
+
+    Parsing an output already collected (``output=``) does not talk to the
+    device and is not limited.
+    """
+
+    def __init__(self, device, deadlines):
+        self._device = device
+        self._deadlines = deadlines
+
+    def __getattr__(self, name):
+        return getattr(self._device, name)
+
+    def execute(self, command, **kwargs):
+        commands = len(command) if isinstance(command, list) else 1
+        return self._deadlines.call(
+            self._device.name,
+            lambda: self._device.execute(command, **kwargs),
+            commands,
+        )
+
+    def parse(self, command, **kwargs):
+        if kwargs.get("output") is not None:
+            return self._device.parse(command, **kwargs)
+        return self._deadlines.call(
+            self._device.name, lambda: self._device.parse(command, **kwargs)
+        )
@@ -0,0 +1,104 @@
+"""
+interfaces.py
+
+Columnar interface state table used by the up/down check
+
+Every OS-specific output is reduced to the same parallel columns, so the
+whole device can be checked in one pass and reported as a single summary
+instead of one step per interface.
+
+"""
+import re
+
+
+class InterfaceTable:
+    """Interface name, status, protocol and admin-down flag as columns
+
+    ``protocol`` is None for outputs without a protocol column (NX-OS), in
+    which case only the status has to be up.
+    """
+
+    __slots__ = ("names", "status", "protocol", "admin_down")
+
+    def __init__(self):
+        self.names = []
+        self.status = []
+        self.protocol = []
+        self.admin_down = []
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, name, status, protocol=None, admin_down=None):
+        self.names.append(name)
+        self.status.append(status)
+        self.protocol.append(protocol)
+        if admin_down is None:
+            admin_down = status.startswith("admin")
+        self.admin_down.append(admin_down)
+
+    def is_up(self, index):
+        protocol = self.protocol[index]
+        return self.status[index] == "up" and (protocol is None or protocol == "up")
+
+    def state(self, index):
+        """Status as logged: 'status' or 'status, protocol'"""
+        protocol = self.protocol[index]
+        status = self.status[index]
+        return status if protocol is None else f"{status}, {protocol}"
+
+    def select(self, include=None, exclude=None, ignore_admin_down=False):
+        """Indexes of the interfaces to check
+
+        ``include``/``exclude`` are regular expressions searched in the
+        interface name.
+        """
+        include = re.compile(include) if include else None
+        exclude = re.compile(exclude) if exclude else None
+        return [
+            index
+            for index, name in enumerate(self.names)
+            if (include is None or include.search(name))
+            and (exclude is None or not exclude.search(name))
+            and not (ignore_admin_down and self.admin_down[index])
+        ]
+
+    def summary(self, indexes):
+        """Counts and failing interfaces over the selected indexes
+
+        Returns a dict with ``total``, ``checked``, ``up`` and ``down``
+        counts and ``failing``, a list of (name, state) tuples.
+        """
+        failing = [(self.names[i], self.state(i)) for i in indexes if not self.is_up(i)]
+        return {
+            "total": len(self.names),
+            "checked": len(indexes),
+            "up": len(indexes) - len(failing),
+            "down": len(failing),
+            "failing": failing,
+        }
+
+
+def from_ip_interface_brief(parsed):
+    """Table from the Genie parse of IOS-XE 'show ip interface brief'"""
+    table = InterfaceTable()
+    for interface, intf in parsed["interface"].items():
+        table.add(interface, intf["status"], intf["protocol"])
+    return table
+
+
+def from_nxos_interface_brief(parsed):
+    """Table of the Ethernet interfaces in the Genie parse of NX-OS 'show interface brief'"""
+    table = InterfaceTable()
+    for interface, intf in parsed["interface"]["ethernet"].items():
+        reason = intf.get("reason") or ""
+        table.add(interface, intf["status"], admin_down=reason.lower().startswith("admin"))
+    return table
+
+
+def from_interface_brief_rows(rows):
+    """Table from parsers.interface_ip_brief rows (ASA/FXOS)"""
+    table = InterfaceTable()
+    for row in rows:
+        table.add(row.interface, row.status, row.protocol)
+    return table
@@ -0,0 +1,234 @@
+"""
+metrics.py
+
+Per-device, per-command timings with a JSON report and a Prometheus textfile
+
+Every timed call appends one (device, phase, command, seconds, bytes) tuple
+to Metrics.samples: device connects, executes and parses through a
+TimedDevice, and the device checks of every test. A list append is atomic,
+so the worker threads record without any lock, and the summaries are only
+computed once, when the report is written at the end of the run.
+
+Metrics.sections holds the wall time of the sections of the run: the
+startup steps and every test.
+
+The JSON report keeps the raw samples next to the summaries, so the reports
+of several shards can be merged into one for the job.
+
+"""
+import json
+import logging
+import math
+import os
+import time
+
+# create a logger for this module
+logger = logging.getLogger(__name__)
+
+PHASES = ("connect", "execute", "parse", "check")
+QUANTILES = (0.5, 0.95, 0.99)
+# prefix of the exported Prometheus metric names
+PREFIX = "network_test"
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of sorted values"""
+    if not values:
+        return 0.0
+    return values[max(0, min(len(values) - 1, math.ceil(q * len(values)) - 1))]
+
+
+def _stats(samples):
+    """Count, sum, quantiles and bytes of (device, phase, command, seconds, bytes) samples"""
+    seconds = sorted(sample[3] for sample in samples)
+    stats = {"count": len(seconds), "sum": round(sum(seconds), 6)}
+    for q in QUANTILES:
+        stats[f"p{round(q * 100)}"] = round(percentile(seconds, q), 6)
+    stats["bytes"] = sum(sample[4] for sample in samples)
+    return stats
+
+
+class Metrics:
+    """Timing samples of one run"""
+
+    def __init__(self, samples=None, sections=None):
+        self.samples = list(samples or ())
+        # section name -> wall seconds
+        self.sections = dict(sections or {})
+        self._timed = {}
+
+    def record(self, device, phase, command, seconds, nbytes=0):
+        self.samples.append((device, phase, command, seconds, nbytes))
+
+    def timed(self, device):
+        """TimedDevice for a device, one per device name"""
+        if device.name not in self._timed:
+            self._timed[device.name] = TimedDevice(device, self)
+        return self._timed[device.name]
+
+    def summary(self, top=10):
+        """Per-phase and per-command statistics and the ``top`` slowest devices"""
+        by_phase, by_command, by_device = {}, {}, {}
+        for sample in self.samples:
+            device, phase, command = sample[:3]
+            by_phase.setdefault(phase, []).append(sample)
+            if command is not None:
+                by_command.setdefault((phase, command), []).append(sample)
+            totals = by_device.setdefault(device, {})
+            totals[phase] = totals.get(phase, 0.0) + sample[3]
+
+        commands = {}
+        for (phase, command), samples in sorted(by_command.items()):
+            commands.setdefault(phase, {})[command] = _stats(samples)
+        slowest = sorted(by_device.items(), key=lambda item: sum(item[1].values()), reverse=True)
+        return {
+            "devices": len(by_device),
+            "sections": {name: round(seconds, 6) for name, seconds in self.sections.items()},
+            "phases": {phase: _stats(by_phase[phase]) for phase in PHASES if phase in by_phase},
+            "commands": commands,
+            "slowest_devices": [
+                {
+                    "device": device,
+                    "seconds": round(sum(totals.values()), 6),
+                    "phases": {phase: round(seconds, 6) for phase, seconds in totals.items()},
+                }
+                for device, totals in slowest[:top]
+            ],
+        }
+
+    def write_json(self, path, top=10):
+        report = dict(self.summary(top), samples=self.samples)
+        _write(path, json.dumps(report))
+
+    def write_textfile(self, path, top=10):
+        """Write the summary in the Prometheus text format, e.g. for the
+        node_exporter textfile collector"""
+        summary = self.summary(top)
+        lines = _summary_lines(
+            f"{PREFIX}_duration_seconds",
+            "Wall time of device calls and checks, by phase.",
+            [({"phase": phase}, stats) for phase, stats in summary["phases"].items()],
+        )
+        # a metric of its own, so a sum over either one counts every call once
+        lines += _summary_lines(
+            f"{PREFIX}_command_duration_seconds",
+            "Wall time of device calls and checks, by phase and command or check.",
+            [
+                ({"phase": phase, "command": command}, stats)
+                for phase, commands in summary["commands"].items()
+                for command, stats in commands.items()
+            ],
+        )
+        lines += [
+            f"# HELP {PREFIX}_output_bytes Bytes of device output.",
+            f"# TYPE {PREFIX}_output_bytes gauge",
+        ]
+        for command, stats in summary["commands"].get("execute", {}).items():
+            lines.append(f"{PREFIX}_output_bytes{_labels({'command': command})} {stats['bytes']}")
+        lines += [
+            f"# HELP {PREFIX}_section_seconds Wall time of the startup steps and tests.",
+            f"# TYPE {PREFIX}_section_seconds gauge",
+        ]
+        for section, seconds in summary["sections"].items():
+            lines.append(f"{PREFIX}_section_seconds{_labels({'section': section})} {seconds}")
+        lines += [
+            f"# HELP {PREFIX}_slowest_device_seconds Total wall time of the slowest devices.",
+            f"# TYPE {PREFIX}_slowest_device_seconds gauge",
+        ]
+        for rank, device in enumerate(summary["slowest_devices"], 1):
+            labels = {"device": device["device"], "rank": rank}
+            lines.append(f"{PREFIX}_slowest_device_seconds{_labels(labels)} {device['seconds']}")
+        _write(path, "\n".join(lines) + "\n")
+
+    def log_summary(self, top=5):
+        summary = self.summary(top)
+        for section, seconds in summary["sections"].items():
+            logger.info(f"{section:<24} {seconds:>9.3f}s")
+        for phase, stats in summary["phases"].items():
+            logger.info(
+                f"{phase:<8} {stats['count']:>6} call(s), p50 {stats['p50']:.3f}s, "
+                f"p95 {stats['p95']:.3f}s, p99 {stats['p99']:.3f}s, {stats['bytes']} bytes"
+            )
+        for device in summary["slowest_devices"]:
+            logger.info(f"slow device {device['device']}: {device['seconds']:.3f}s")
+
+    @classmethod
+    def load(cls, paths):
+        """Metrics holding the samples of JSON reports, e.g. of every shard
+
+        Shards run in parallel: a section takes as long as in the slowest one.
+        """
+        samples, sections = [], {}
+        for path in paths:
+            with open(path) as f:
+                report = json.load(f)
+            samples.extend(tuple(sample) for sample in report["samples"])
+            for name, seconds in report.get("sections", {}).items():
+                sections[name] = max(seconds, sections.get(name, 0.0))
+        return cls(samples, sections)
+
+
+def _summary_lines(name, description, series):
+    """Prometheus summary of (labels, stats) series"""
+    lines = [f"# HELP {name} {description}", f"# TYPE {name} summary"]
+    for labels, stats in series:
+        for q in QUANTILES:
+            lines.append(f"{name}{_labels(labels, quantile=q)} {stats[f'p{round(q * 100)}']}")
+        lines.append(f"{name}_sum{_labels(labels)} {stats['sum']}")
+        lines.append(f"{name}_count{_labels(labels)} {stats['count']}")
+    return lines
+
+
+def _labels(labels, **extra):
+    labels = dict(labels, **extra)
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _write(path, text):
+    """Write a file atomically, so a collector never reads half of it"""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+class TimedDevice:
+    """Device wrapper timing every connect, execute and parse
+
+    The commands of a list are sent one at a time, as unicon does anyway,
+    so each command is timed on its own.
+    """
+
+    def __init__(self, device, metrics):
+        self._device = device
+        self._metrics = metrics
+
+    def __getattr__(self, name):
+        return getattr(self._device, name)
+
+    def connect(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._device.connect(*args, **kwargs)
+        finally:
+            self._metrics.record(self._device.name, "connect", None, time.perf_counter() - start)
+
+    def execute(self, command, **kwargs):
+        if isinstance(command, list):
+            return {each: self.execute(each, **kwargs) for each in command}
+        start = time.perf_counter()
+        output = self._device.execute(command, **kwargs)
+        elapsed = time.perf_counter() - start
+        self._metrics.record(self._device.name, "execute", command, elapsed, len(output or ""))
+        return output
+
+    def parse(self, command, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._device.parse(command, **kwargs)
+        finally:
+            self._metrics.record(self._device.name, "parse", command, time.perf_counter() - start)
@@ -0,0 +1,173 @@
+"""
+mock.py
+
+Local mock devices with configurable latency, for trying the job offline
+
+MockDevice answers every command of checks.SPEC with canned outputs sized
+by its interface count, after sleeping its latency for every command, and
+parses them itself, without Genie. Give a few devices a large latency to
+see how the run copes with slow or hung devices.
+
+"""
+import random
+import time
+
+OS_NAMES = ("ios", "nxos", "iosxe", "asa", "fxos")
+
+_INTERFACE_HEADER = (
+    "Interface                  IP-Address      OK? Method Status                Protocol\n"
+)
+
+
+def _interface_brief(interfaces):
+    return _INTERFACE_HEADER + "".join(
+        f"GigabitEthernet0/{i:<9} 10.0.{i // 250}.{i % 250 + 1:<6} YES manual up"
+        "                    up\n"
+        for i in range(interfaces)
+    )
+
+
+RAW = {
+    "show version": (
+        "Cisco Adaptive Security Appliance Software Version 9.12\nasa up 10 days 3 hours\n"
+    ),
+    "show version system": "Version: 2.8\nUptime: up 12 days 1 hour\n",
+    "show cpu usage": "CPU utilization for 5 seconds = 12%; 1 minute: 9%; 5 minutes: 7%\n",
+    "show cpu": "CPU 0 12%\nCPU 1 9%\n",
+    "show memory": "Free memory: 5033431040 bytes (59%)\nUsed memory: 3556556800 bytes (41%)\n",
+    "show system resource": "Memory usage:   16400152K total,   6351272K used,   10048880K free\n",
+    "show platform software status control-processor brief": (
+        "RP0 Healthy 3869120 2188856 (57%) 1680264 (43%)\n"
+    ),
+}
+
+
+def _parsed(os_name, command, interfaces):
+    if command == "show version":
+        if os_name == "iosxe":
+            return {"version": {"uptime": "2 weeks, 1 day, 3 hours"}}
+        return {"platform": {"kernel_uptime": {"days": 12}}}
+    if command == "show ip interface brief":
+        return {
+            "interface": {
+                f"GigabitEthernet1/0/{i}": {"status": "up", "protocol": "up"}
+                for i in range(interfaces)
+            }
+        }
+    if command == "show interface brief":
+        return {
+            "interface": {
+                "ethernet": {
+                    f"Eth1/{i}": {"status": "up", "reason": "none"} for i in range(interfaces)
+                }
+            }
+        }
+    if command == "sh proc cpu":
+        if os_name == "iosxe":
+            return {"five_sec_cpu_total": 5, "one_min_cpu": 4, "five_min_cpu": 3}
+        return {"kernel_percent": 3.0}
+    raise ValueError(f"no mock parser for '{command}' on {os_name}")
+
+
+class MockDevice:
+    """Device answering after ``latency`` (plus up to ``jitter``) seconds per command
+
+    Logging in takes ``connect_latency`` seconds, ``latency`` by default.
+    """
+
+    def __init__(
+        self,
+        name,
+        os_name,
+        latency=0.0,
+        jitter=0.0,
+        interfaces=8,
+        fail_connect=False,
+        connect_latency=None,
+    ):
+        self.name = name
+        self.os = os_name
+        self.latency = latency
+        self.connect_latency = latency if connect_latency is None else connect_latency
+        self.jitter = jitter
+        self.interfaces = interfaces
+        self.fail_connect = fail_connect
+        self.connected = False
+        self.custom = {}
+        self.commands_sent = 0
+
+    def _wait(self, latency):
+        time.sleep(latency + (random.uniform(0, self.jitter) if self.jitter else 0.0))
+
+    def connect(self, **kwargs):
+        self._wait(self.connect_latency)
+        if self.fail_connect:
+            raise ConnectionError(f"{self.name} refused the connection")
+        self.connected = True
+
+    def disconnect(self):
+        self.connected = False
+
+    def destroy(self):
+        self.connected = False
+
+    def execute(self, command, **kwargs):
+        if isinstance(command, list):
+            return {each: self.execute(each) for each in command}
+        self._wait(self.latency)
+        self.commands_sent += 1
+        if command == "show interface ip brief":
+            return _interface_brief(self.interfaces)
+        return RAW.get(command, f"{self.name}# {command}\n")
+
+    def parse(self, command, output=None, **kwargs):
+        if output is None:
+            self.execute(command)
+        return _parsed(self.os, command, self.interfaces)
+
+
+class MockTestbed:
+    """Testbed of MockDevices"""
+
+    def __init__(self, devices, name="mock"):
+        self.name = name
+        self.devices = {device.name: device for device in devices}
+
+    def __iter__(self):
+        return iter(self.devices.values())
+
+    def __len__(self):
+        return len(self.devices)
+
+    def remove_device(self, device):
+        del self.devices[device.name]
+
+
+def make_testbed(
+    count,
+    os_names=OS_NAMES,
+    latency=0.0,
+    jitter=0.0,
+    interfaces=8,
+    slow=0,
+    slow_latency=60.0,
+    connect_latency=None,
+):
+    """MockTestbed of ``count`` devices spread over ``os_names``
+
+    The last ``slow`` devices answer after ``slow_latency`` seconds instead.
+    """
+    devices = []
+    for index in range(count):
+        os_name = os_names[index % len(os_names)]
+        devices.append(
+            MockDevice(
+                f"{os_name}-{index:05d}",
+                os_name,
+                slow_latency if index >= count - slow else latency,
+                jitter,
+                interfaces,
+                connect_latency=connect_latency,
+            )
+        )
+    return MockTestbed(devices)
@@ -7,19 +7,343 @@ Example multi-testscript job file
 # see https://pubhub.devnetcloud.com/media/pyats/docs/easypy/jobfile.html
 # for how job files work
 
+import argparse
+import logging
 import os
-from pyats.easypy import run
+import sys
+from pyats.easypy import Task, run
 
 # compute the script path from this location
 SCRIPT_PATH = os.path.dirname(__file__)
 
+# make the helper modules next to this file importable
+sys.path.insert(0, SCRIPT_PATH)
 
-def main(runtime):
-    """job file entrypoint"""
+from broker import DEFAULT_SOCKET  # noqa: E402
+from metrics import Metrics  # noqa: E402
+from replay import OutputStore, ReplayTestbed  # noqa: E402
+from sharding import SHARD_BY, split_devices  # noqa: E402
 
-    # run script
-    run(
-        testscript=os.path.join(SCRIPT_PATH, "verify_test.py"),
-        runtime=runtime,
-        taskid="Device Connections",
+# create a logger for this module
+logger = logging.getLogger(__name__)
+
+# custom job arguments, e.g. pyats run job network_test_job.py --connect-workers 64
+parser = argparse.ArgumentParser(description="network test job arguments")
+parser.add_argument(
+    "--connect-workers",
+    dest="connect_workers",
+    type=int,
+    default=32,
+    help="maximum number of devices connecting at the same time",
+)
+parser.add_argument(
+    "--connect-timeout",
+    dest="connect_timeout",
+    type=int,
+    default=60,
+    help="per-device connect timeout in seconds",
+)
+parser.add_argument(
+    "--connect-retries",
+    dest="connect_retries",
+    type=int,
+    default=2,
+    help="extra connect attempts after a failure",
+)
+parser.add_argument(
+    "--connect-backoff",
+    dest="connect_backoff",
+    type=float,
+    default=2.0,
+    help="base delay in seconds between connect attempts",
+)
+parser.add_argument(
+    "--device-workers",
+    dest="device_workers",
+    type=int,
+    default=1,
+    help="number of devices each test checks in parallel",
+)
+parser.add_argument(
+    "--checks",
+    dest="checks",
+    nargs="+",
+    default=["last_reload", "updown_validation", "cpu_util", "memory_util"],
+    help="checks to run",
+)
+parser.add_argument(
+    "--check-plan",
+    dest="check_plan",
+    default=None,
+    help="YAML check spec to use instead of the built-in one (see checks.SPEC)",
+)
+parser.add_argument(
+    "--snapshot-file",
+    dest="snapshot_file",
+    default=None,
+    help="file keeping command snapshots between runs, outside the job directory "
+    "which is new for every run, needed by --snapshot-ttl",
+)
+parser.add_argument(
+    "--snapshot-ttl",
+    dest="snapshot_ttl",
+    type=int,
+    default=0,
+    help="seconds a command snapshot stored in --snapshot-file is reused by later runs",
+)
+parser.add_argument(
+    "--record",
+    dest="record_file",
+    default=None,
+    help="record every device output of the run into this store file",
+)
+parser.add_argument(
+    "--replay",
+    dest="replay_file",
+    default=None,
+    help="replay device outputs from this store file instead of the network",
+)
+parser.add_argument(
+    "--interface-detail",
+    dest="interface_detail",
+    action="store_true",
+    help="report one step per interface instead of one summary per device",
+)
+parser.add_argument(
+    "--interface-include",
+    dest="interface_include",
+    default=None,
+    help="regular expression of interface names to check",
+)
+parser.add_argument(
+    "--interface-exclude",
+    dest="interface_exclude",
+    default=None,
+    help="regular expression of interface names to leave out",
+)
+parser.add_argument(
+    "--ignore-admin-down",
+    dest="ignore_admin_down",
+    action="store_true",
+    help="leave administratively down interfaces out of the up/down check",
+)
+parser.add_argument(
+    "--shards",
+    dest="shards",
+    type=int,
+    default=1,
+    help="split the testbed into this many tasks running in parallel",
+)
+parser.add_argument(
+    "--shard-by",
+    dest="shard_by",
+    choices=SHARD_BY,
+    default="count",
+    help="split by device count, or keep devices of the same OS or site together",
+)
+parser.add_argument(
+    "--metrics-file",
+    dest="metrics_file",
+    default=None,
+    help="JSON timing report of the run, defaults to metrics.json in the job directory",
+)
+parser.add_argument(
+    "--metrics-textfile",
+    dest="metrics_textfile",
+    default=None,
+    help="write the timing summary to this Prometheus textfile, "
+    "e.g. in the node_exporter textfile directory",
+)
+parser.add_argument(
+    "--metrics-top",
+    dest="metrics_top",
+    type=int,
+    default=10,
+    help="number of slowest devices listed in the timing report",
+)
+parser.add_argument(
+    "--job-budget",
+    dest="job_budget",
+    type=float,
+    default=None,
+    help="seconds the run may take, devices left over are reported as timed out",
+)
+parser.add_argument(
+    "--device-timeout",
+    dest="device_timeout",
+    type=float,
+    default=None,
+    help="longest a device call may take before the device is skipped as timed out",
+)
+parser.add_argument(
+    "--min-device-timeout",
+    dest="min_device_timeout",
+    type=float,
+    default=10.0,
+    help="shortest deadline given to a device call, however fast the device answers",
+)
+parser.add_argument(
+    "--timeout-factor",
+    dest="timeout_factor",
+    type=float,
+    default=5.0,
+    help="device deadline as a multiple of the latency observed from it",
+)
+parser.add_argument(
+    "--state-file",
+    dest="state_file",
+    default=None,
+    help="state file kept between runs, unchanged devices reuse their verdicts",
+)
+parser.add_argument(
+    "--state-staleness",
+    dest="state_staleness",
+    type=int,
+    default=3600,
+    help="seconds the verdicts of an unchanged device are reused for",
+)
+parser.add_argument(
+    "--full-refresh-every",
+    dest="full_refresh_every",
+    type=int,
+    default=0,
+    help="check every device in full every this many runs, 0 for never",
+)
+parser.add_argument(
+    "--results-file",
+    dest="results_file",
+    default=None,
+    help="JSON Lines file of one record per device and check, gzipped if it "
+    "ends in .gz, defaults to results.jsonl in the job directory",
+)
+parser.add_argument(
+    "--results-compress",
+    dest="results_compress",
+    action="store_true",
+    help="zlib-compress the raw output kept for failed checks",
+)
+parser.add_argument(
+    "--broker",
+    dest="broker_socket",
+    nargs="?",
+    const=DEFAULT_SOCKET,
+    default=None,
+    help="send the commands through the warm sessions of a running broker.py, "
+    f"on this socket or {DEFAULT_SOCKET}",
+)
+
+
+def main(runtime, testbed=None):
+    """job file entrypoint
+
+    ``testbed`` replaces the testbed of the job, e.g. the mock testbed of
+    benchmarks/scale_job.py.
+    """
+
+    # parse the custom job arguments, leaving the easypy ones alone
+    args = parser.parse_known_args()[0]
+
+    # Snapshots are shared between runs through a file of their own: the job
+    # directory is a new one for every run
+    if args.snapshot_ttl and not args.snapshot_file:
+        parser.error("--snapshot-ttl needs a --snapshot-file kept between the runs")
+
+    script_args = dict(
+        connect_workers=args.connect_workers,
+        connect_timeout=args.connect_timeout,
+        connect_retries=args.connect_retries,
+        connect_backoff=args.connect_backoff,
+        device_workers=args.device_workers,
+        checks=args.checks,
+        check_plan=args.check_plan,
+        snapshot_file=args.snapshot_file,
+        snapshot_ttl=args.snapshot_ttl,
+        record_file=args.record_file,
+        replay_file=args.replay_file,
+        interface_detail=args.interface_detail,
+        interface_include=args.interface_include,
+        interface_exclude=args.interface_exclude,
+        ignore_admin_down=args.ignore_admin_down,
+        # timing report of the run, next to the other job files
+        metrics_file=args.metrics_file or os.path.join(runtime.directory, "metrics.json"),
+        metrics_textfile=args.metrics_textfile,
+        metrics_top=args.metrics_top,
+        job_budget=args.job_budget,
+        device_timeout=args.device_timeout,
+        min_device_timeout=args.min_device_timeout,
+        timeout_factor=args.timeout_factor,
+        state_file=args.state_file,
+        state_staleness=args.state_staleness,
+        full_refresh_every=args.full_refresh_every,
+        results_file=args.results_file or os.path.join(runtime.directory, "results.jsonl"),
+        results_compress=args.results_compress,
+        broker_socket=args.broker_socket,
     )
+    if testbed is not None:
+        script_args["testbed"] = testbed
+
+    if args.shards <= 1:
+        # run script
+        run(
+            testscript=os.path.join(SCRIPT_PATH, "verify_test.py"),
+            runtime=runtime,
+            taskid="Device Connections",
+            **script_args,
+        )
+        return
+
+    run_shards(runtime, args.shards, args.shard_by, script_args)
+
+
+def run_shards(runtime, shards, shard_by, script_args):
+    """Run verify_test.py as one parallel easypy task per testbed shard"""
+    testbed = script_args.get("testbed") or runtime.testbed
+    if script_args["replay_file"] and testbed is None:
+        devices = ReplayTestbed(OutputStore(script_args["replay_file"])).devices.values()
+    else:
+        devices = testbed.devices.values()
+    shard_devices = split_devices(devices, shards, by=shard_by)
+
+    tasks = []
+    for index, names in enumerate(shard_devices, 1):
+        shard_args = dict(script_args, shard_devices=names)
+        if shard_args["snapshot_file"]:
+            # one snapshot file per shard, reused by the same shard later
+            shard_args["snapshot_file"] = f"{shard_args['snapshot_file']}.shard{index}"
+        if shard_args["state_file"]:
+            # one state file per shard, like the snapshots
+            shard_args["state_file"] = f"{shard_args['state_file']}.shard{index}"
+        # one result records file per shard, ahead of the extension
+        root, ext = os.path.splitext(shard_args["results_file"])
+        shard_args["results_file"] = f"{root}.shard{index}{ext}"
+        # one timing report per shard, merged into the job report below
+        shard_args["metrics_file"] = f"{script_args['metrics_file']}.shard{index}"
+        shard_args["metrics_textfile"] = None
+        task = Task(
+            testscript=os.path.join(SCRIPT_PATH, "verify_test.py"),
+            runtime=runtime,
+            taskid=f"Device Connections shard {index}/{len(shard_devices)}",
+            **shard_args,
+        )
+        task.start()
+        tasks.append((task, names))
+
+    for task, names in tasks:
+        task.wait()
+
+    # merge the shard results into one summary
+    logger.info(f"{'Shard':<40} {'Devices':>8}  Result")
+    for task, names in tasks:
+        logger.info(f"{task.taskid:<40} {len(names):>8}  {task.result}")
+    result = sum((task.result for task, names in tasks[1:]), tasks[0][0].result)
+    logger.info(f"{'All shards':<40} {sum(len(names) for task, names in tasks):>8}  {result}")
+
+    # merge the shard timing reports into the job one
+    reports = [
+        f"{script_args['metrics_file']}.shard{index}" for index in range(1, len(tasks) + 1)
+    ]
+    metrics = Metrics.load(report for report in reports if os.path.exists(report))
+    metrics.write_json(script_args["metrics_file"], script_args["metrics_top"])
+    if script_args["metrics_textfile"]:
+        metrics.write_textfile(script_args["metrics_textfile"], script_args["metrics_top"])
+    metrics.log_summary()
@@ -0,0 +1,106 @@
+"""
+parsers.py
+
+Fast-path parsers for ASA and FXOS outputs without a Genie parser
+
+The patterns are compiled once at import and each parser makes a single pass
+over the raw output, without splitting it into per-line lists first. Use
+parse() to look the parser up by device OS and command.
+
+"""
+import re
+from collections import namedtuple
+
+# One row of "show interface ip brief"
+InterfaceBrief = namedtuple(
+    "InterfaceBrief", "interface ip_address ok method status protocol"
+)
+
+
+class ParserError(ValueError):
+    """The output does not contain what the parser looks for"""
+
+
+# Interface rows; the OK? column keeps the header row out, Status may hold
+# spaces ("administratively down") and raw terminal lines may end in \r
+_INTERFACE_BRIEF = re.compile(
+    r"^(\S+)[ \t]+(\S+)[ \t]+(YES|NO)[ \t]+(\S+)[ \t]+(\S.*?)[ \t]+(\S+)[ \t\r]*$",
+    re.MULTILINE,
+)
+_PERCENT = re.compile(r"(\d+(?:\.\d+)?)%")
+_USED_MEMORY = re.compile(r"Used memory[^\n]*?(\d+(?:\.\d+)?)%")
+_UPTIME_LINE = re.compile(r"^.*\bup (.*)$", re.MULTILINE)
+_UPTIME_PART = re.compile(r"(\d+)\s+(year|week|day|hour|min|sec)")
+_UPTIME_DAYS = {
+    "year": 365.0,
+    "week": 7.0,
+    "day": 1.0,
+    "hour": 1 / 24,
+    "min": 1 / 1440,
+    "sec": 1 / 86400,
+}
+
+
+def interface_ip_brief(output):
+    """List of InterfaceBrief rows, in output order"""
+    rows = [InterfaceBrief(*match.groups()) for match in _INTERFACE_BRIEF.finditer(output)]
+    if not rows and output.strip():
+        raise ParserError("no interface rows in output")
+    return rows
+
+
+def cpu_percentages(output):
+    """Every CPU percentage in the output, e.g. the 5 second, 1 and 5 minute loads"""
+    values = [float(value) for value in _PERCENT.findall(output)]
+    if not values:
+        raise ParserError("no CPU percentage in output")
+    return values
+
+
+def used_memory_percent(output):
+    """Percentage on the "Used memory" line"""
+    match = _USED_MEMORY.search(output)
+    if match is None:
+        raise ParserError("no 'Used memory' percentage in output")
+    return float(match.group(1))
+
+
+def uptime_days(text):
+    """Days in an uptime such as '1 week, 2 days, 3 hours, 4 minutes'"""
+    return sum(
+        int(count) * _UPTIME_DAYS[unit] for count, unit in _UPTIME_PART.findall(text)
+    )
+
+
+def uptime(output):
+    """Uptime in days from the "... up 10 days 3 hours" line of show version"""
+    match = _UPTIME_LINE.search(output)
+    if match is None:
+        raise ParserError("no uptime line in output")
+    return uptime_days(match.group(1))
+
+
+# parser by device OS and command
+PARSERS = {
+    "asa": {
+        "show version": uptime,
+        "show interface ip brief": interface_ip_brief,
+        "show cpu usage": cpu_percentages,
+        "show memory": used_memory_percent,
+    },
+    "fxos": {
+        "show version system": uptime,
+        "show interface ip brief": interface_ip_brief,
+        "show cpu": cpu_percentages,
+        "show memory": used_memory_percent,
+    },
+}
+
+
+def parse(os_name, command, output):
+    """Parse a raw output with the fast-path parser for its OS and command"""
+    try:
+        parser = PARSERS[os_name][command]
+    except KeyError:
+        raise ParserError(f"no parser for '{command}' on {os_name}") from None
+    return parser(output)
@@ -0,0 +1,290 @@
+"""
+poller.py
+
+Continuous polling of the threshold checks into fixed-size ring buffers
+
+Keeps the device sessions open and samples the checks of the compiled check
+plan (CPU and memory by default) every interval. Every device, check and
+value gets a Series: a ring buffer of the latest samples plus a ring buffer
+of older samples downsampled by averaging. Both are array-backed and fixed
+in size, so memory per device stays bounded however long the poller runs. A
+breach is only raised once a value has failed its threshold for a whole
+window of consecutive samples.
+
+    python poller.py --testbed testbed.yaml --interval 60 --window 5
+
+"""
+import argparse
+import logging
+import time
+from array import array
+
+from checks import CHECKS, compile_plan, load_spec
+from connection import connect_devices
+from snapshot import SnapshotCache
+
+# create a logger for this module
+logger = logging.getLogger(__name__)
+
+
+class RingBuffer:
+    """Fixed-size ring of (timestamp, value) pairs in two arrays of doubles"""
+
+    __slots__ = ("times", "values", "size", "count", "next")
+
+    def __init__(self, size):
+        self.times = array("d", bytes(8 * size))
+        self.values = array("d", bytes(8 * size))
+        self.size = size
+        self.count = 0
+        self.next = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, timestamp, value):
+        self.times[self.next] = timestamp
+        self.values[self.next] = value
+        self.next = (self.next + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def latest(self, n=None):
+        """Up to ``n`` most recent values, oldest first"""
+        n = self.count if n is None else min(n, self.count)
+        start = (self.next - n) % self.size
+        return [self.values[(start + i) % self.size] for i in range(n)]
+
+    def items(self):
+        """Every (timestamp, value) pair, oldest first"""
+        start = (self.next - self.count) % self.size
+        return [
+            (self.times[(start + i) % self.size], self.values[(start + i) % self.size])
+            for i in range(self.count)
+        ]
+
+    @property
+    def nbytes(self):
+        return (len(self.times) + len(self.values)) * self.values.itemsize
+
+
+class Series:
+    """Recent samples and downsampled history of one device value
+
+    Every ``downsample`` samples, their mean is appended to the history ring,
+    which therefore covers ``downsample`` times the span of the recent ring.
+    """
+
+    __slots__ = ("recent", "history", "downsample", "_sum", "_pending")
+
+    def __init__(self, size=360, downsample=10):
+        self.recent = RingBuffer(size)
+        self.history = RingBuffer(size)
+        self.downsample = downsample
+        self._sum = 0.0
+        self._pending = 0
+
+    def append(self, timestamp, value):
+        self.recent.append(timestamp, value)
+        self._sum += value
+        self._pending += 1
+        if self._pending == self.downsample:
+            self.history.append(timestamp, self._sum / self._pending)
+            self._sum = 0.0
+            self._pending = 0
+
+    @property
+    def nbytes(self):
+        return self.recent.nbytes + self.history.nbytes
+
+
+class Poller:
+    """Sample the plan's threshold checks of connected devices every interval
+
+    Dropped devices are reconnected in parallel before a sample. A device
+    which keeps failing to reconnect is retried after 1, 2, 4, 8... samples,
+    skipping at most ``max_reconnect_skip`` samples in a row.
+    """
+
+    def __init__(
+        self,
+        devices,
+        plan,
+        interval=60,
+        size=360,
+        downsample=10,
+        window=3,
+        workers=8,
+        connect_timeout=60,
+        max_reconnect_skip=16,
+    ):
+        self.devices = list(devices)
+        self.plan = plan
+        self.interval = interval
+        self.size = size
+        self.downsample = downsample
+        self.window = window
+        self.workers = workers
+        self.connect_timeout = connect_timeout
+        self.max_reconnect_skip = max_reconnect_skip
+        # device name -> [failed reconnects in a row, samples left to skip]
+        self.reconnects = {}
+        # (device name, check, label) -> Series
+        self.series = {}
+        # keys currently in sustained breach
+        self.breaches = set()
+
+    def connect(self):
+        connect_devices(self.devices, workers=self.workers, timeout=self.connect_timeout)
+
+    def _reconnect(self):
+        due = []
+        for device in self.devices:
+            if device.connected:
+                continue
+            backoff = self.reconnects.get(device.name)
+            if backoff is not None and backoff[1] > 0:
+                backoff[1] -= 1
+                continue
+            due.append(device)
+        if not due:
+            return
+        statuses = connect_devices(
+            due, workers=self.workers, timeout=self.connect_timeout, retries=0
+        )
+        for name, status in statuses.items():
+            if status.connected:
+                self.reconnects.pop(name, None)
+                logger.info(f"{name} reconnected")
+                continue
+            backoff = self.reconnects.setdefault(name, [0, 0])
+            backoff[0] += 1
+            backoff[1] = min(2 ** (backoff[0] - 1) - 1, self.max_reconnect_skip)
+            logger.warning(
+                f"{name} still down after {backoff[0]} reconnect attempt(s), "
+                f"retried in {backoff[1] + 1} sample(s): {status.error}"
+            )
+
+    def sample(self):
+        """Take one sample of every check on every connected device
+
+        Returns the number of values recorded.
+        """
+        self._reconnect()
+        snapshot = SnapshotCache()
+        snapshot.collect(self.devices, self.plan, workers=self.workers)
+        now = time.time()
+        recorded = 0
+        for device in self.devices:
+            if not device.connected:
+                continue
+            view = snapshot.device(device)
+            for name, check in self.plan.dispatch.get(device.os, {}).items():
+                if check.compare is None:
+                    continue
+                try:
+                    values = check.values(view)
+                except Exception as e:
+                    logger.warning(f"{device.name}, {name} could not be sampled: {e}")
+                    continue
+                for label, value in values:
+                    self._record((device.name, name, label), check, now, float(value))
+                    recorded += 1
+        return recorded
+
+    def _record(self, key, check, timestamp, value):
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = Series(self.size, self.downsample)
+        series.append(timestamp, value)
+        window = series.recent.latest(self.window)
+        breached = len(window) == self.window and not any(
+            check.compare(v, check.threshold) for v in window
+        )
+        device_name, name, label = key
+        if breached and key not in self.breaches:
+            self.breaches.add(key)
+            logger.error(
+                f"{device_name}, {name} {label} breached for {self.window} samples: "
+                f"{window}, {check.failed}"
+            )
+        elif not breached and key in self.breaches:
+            self.breaches.discard(key)
+            logger.info(f"{device_name}, {name} {label} back within threshold: {value}")
+
+    def memory_bytes(self, device_name=None):
+        """Bytes held by the ring buffers, of one device or of all of them"""
+        return sum(
+            series.nbytes
+            for key, series in self.series.items()
+            if device_name is None or key[0] == device_name
+        )
+
+    def run(self, count=None):
+        """Sample every interval, ``count`` times or until interrupted"""
+        taken = 0
+        while count is None or taken < count:
+            start = time.monotonic()
+            recorded = self.sample()
+            taken += 1
+            logger.info(
+                f"Sample {taken}: {recorded} value(s), {len(self.breaches)} breach(es), "
+                f"{self.memory_bytes()} bytes in {len(self.series)} series"
+            )
+            if count is None or taken < count:
+                time.sleep(max(0.0, self.interval - (time.monotonic() - start)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="continuous CPU/memory poller")
+    parser.add_argument("--testbed", required=True, help="testbed YAML file")
+    parser.add_argument("--interval", type=float, default=60, help="seconds between samples")
+    parser.add_argument("--samples", type=int, default=360, help="recent samples kept per value")
+    parser.add_argument(
+        "--downsample", type=int, default=10, help="samples averaged into one history point"
+    )
+    parser.add_argument(
+        "--window", type=int, default=3, help="consecutive failing samples raising a breach"
+    )
+    parser.add_argument("--checks", nargs="+", default=["cpu_util", "memory_util"], choices=CHECKS)
+    parser.add_argument("--check-plan", default=None, help="YAML check spec, see checks.SPEC")
+    parser.add_argument("--count", type=int, default=None, help="stop after this many samples")
+    parser.add_argument("--workers", type=int, default=8, help="devices polled in parallel")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    from pyats.topology import loader
+
+    testbed = loader.load(args.testbed)
+    plan = compile_plan(
+        load_spec(args.check_plan),
+        args.checks,
+        {device.os for device in testbed.devices.values()},
+    )
+    if plan.parses():
+        # Genie devices are only needed to parse outputs
+        from genie.testbed import load
+
+        testbed = load(testbed)
+    poller = Poller(
+        testbed.devices.values(),
+        plan,
+        interval=args.interval,
+        size=args.samples,
+        downsample=args.downsample,
+        window=args.window,
+        workers=args.workers,
+    )
+    poller.connect()
+    try:
+        poller.run(args.count)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for device in poller.devices:
+            logger.info(f"{device.name}: {poller.memory_bytes(device.name)} bytes of samples")
+            if device.connected:
+                device.disconnect()
+
+
+if __name__ == "__main__":
+    main()
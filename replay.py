@@ -0,0 +1,211 @@
+"""
+replay.py
+
+Record and replay of device command output
+
+In record mode every device.execute/device.parse result is written to an
+OutputStore, a single sqlite file with zlib-compressed outputs indexed by
+device, command and timestamp. In replay mode a ReplayTestbed built from the
+store serves those outputs back through the same device interface, so the
+checks can be re-evaluated offline, without a network, as often as needed.
+
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+
+# create a logger for this module
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS devices (
+    name TEXT PRIMARY KEY,
+    os TEXT
+);
+CREATE TABLE IF NOT EXISTS outputs (
+    device TEXT NOT NULL,
+    command TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    time REAL NOT NULL,
+    data BLOB
+);
+CREATE INDEX IF NOT EXISTS outputs_lookup ON outputs (device, command, kind, time);
+"""
+
+
+class OutputStore:
+    """Compressed on-disk store of command outputs
+
+    Raw output (kind "execute") is stored as compressed text, parsed output
+    (kind "parse") as compressed JSON. Writes are committed as they happen,
+    in WAL mode so they stay cheap. Safe to share between threads.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._recording = {}
+        # shards of a job may record into the same file from several processes
+        self._db = sqlite3.connect(
+            path, timeout=60, check_same_thread=False, isolation_level=None
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def add_device(self, name, os_name):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO devices (name, os) VALUES (?, ?)", (name, os_name)
+            )
+
+    def devices(self):
+        """Recorded device names and OS, by name"""
+        with self._lock:
+            return dict(self._db.execute("SELECT name, os FROM devices ORDER BY name"))
+
+    def put(self, device, command, kind, output, at=None):
+        data = output if kind == "execute" else json.dumps(output)
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO outputs (device, command, kind, time, data) VALUES (?, ?, ?, ?, ?)",
+                (device, command, kind, at or time.time(), zlib.compress(data.encode())),
+            )
+
+    def recording(self, device):
+        """RecordingDevice for a device, one per device name"""
+        if device.name not in self._recording:
+            self._recording[device.name] = RecordingDevice(device, self)
+        return self._recording[device.name]
+
+    def get(self, device, command, kind, at=None):
+        """Latest output recorded at or before ``at``, or None"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT data FROM outputs WHERE device = ? AND command = ? AND kind = ? "
+                "AND time <= ? ORDER BY time DESC LIMIT 1",
+                (device, command, kind, at or float("inf")),
+            ).fetchone()
+        if row is None:
+            return None
+        data = zlib.decompress(row[0]).decode()
+        return data if kind == "execute" else json.loads(data)
+
+
+class RecordingDevice:
+    """Device wrapper writing every execute/parse result to an OutputStore"""
+
+    def __init__(self, device, store):
+        self._device = device
+        self._store = store
+        store.add_device(device.name, device.os)
+
+    def __getattr__(self, name):
+        return getattr(self._device, name)
+
+    def execute(self, command, **kwargs):
+        output = self._device.execute(command, **kwargs)
+        if isinstance(output, dict):
+            # execute of a list of commands
+            for each, each_output in output.items():
+                self._store.put(self._device.name, each, "execute", each_output)
+        else:
+            self._store.put(self._device.name, command, "execute", output)
+        return output
+
+    def parse(self, command, **kwargs):
+        parsed = self._device.parse(command, **kwargs)
+        self._store.put(self._device.name, command, "parse", parsed)
+        return parsed
+
+
+class ReplayError(Exception):
+    """The requested output was never recorded"""
+
+
+class ReplayDevice:
+    """Device answering execute/parse from an OutputStore
+
+    Parsing prefers re-parsing the recorded raw output with the installed
+    Genie parsers, so parser fixes apply to old recordings, and falls back to
+    the recorded parsed output.
+    """
+
+    def __init__(self, name, os_name, store, at=None, source=None):
+        self.name = name
+        self.os = os_name
+        self.connected = False
+        self._store = store
+        self._at = at
+        # recorded device to serve, when replaying it under another name
+        self._source = source or name
+        self._parser = None
+
+    def connect(self, **kwargs):
+        self.connected = True
+
+    def disconnect(self):
+        self.connected = False
+
+    def destroy(self):
+        self.connected = False
+
+    def execute(self, command, **kwargs):
+        if isinstance(command, list):
+            return {each: self.execute(each) for each in command}
+        output = self._store.get(self._source, command, "execute", self._at)
+        if output is None:
+            raise ReplayError(f"{self.name}: no recorded output for '{command}'")
+        return output
+
+    def parse(self, command, output=None, **kwargs):
+        if output is None:
+            output = self._store.get(self._source, command, "execute", self._at)
+        if output is not None:
+            try:
+                return self._genie_device().parse(command, output=output)
+            except ImportError:
+                pass
+        parsed = self._store.get(self._source, command, "parse", self._at)
+        if parsed is None:
+            raise ReplayError(f"{self.name}: no recorded parse for '{command}'")
+        return parsed
+
+    def _genie_device(self):
+        # offline Genie device, only used to pick and run the right parser
+        if self._parser is None:
+            from genie.conf.base import Device
+
+            self._parser = Device(self.name, os=self.os)
+            self._parser.custom.setdefault("abstraction", {})["order"] = ["os"]
+        return self._parser
+
+
+class ReplayTestbed:
+    """Testbed of ReplayDevices for every device in an OutputStore
+
+    With ``names`` only those devices are replayed, e.g. the devices of the
+    testbed file the job was started with.
+    """
+
+    def __init__(self, store, names=None, at=None):
+        self.name = f"replay:{store.path}"
+        recorded = store.devices()
+        if names is not None:
+            recorded = {name: recorded[name] for name in names if name in recorded}
+        self.devices = {
+            name: ReplayDevice(name, os_name, store, at) for name, os_name in recorded.items()
+        }
+
+    def __iter__(self):
+        return iter(self.devices.values())
+
+    def __len__(self):
+        return len(self.devices)
@@ -0,0 +1,229 @@
+"""
+runner.py
+
+Per-device concurrent execution of testcase checks
+
+Device checks run in a thread pool and record what they would have done to
+their step (log lines, printed output, nested steps, pass/fail) into a
+DeviceResult. The testcase then opens its steps in testbed order on the main
+thread and replays each result into the matching step, so the report is the
+same whatever order the devices finish in.
+
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pprint import pprint
+
+from deadline import DeadlineExceeded
+
+# create a logger for this module
+logger = logging.getLogger(__name__)
+
+
+class StepFailed(Exception):
+    """Raised by DeviceResult.failed() to end the check, like step.failed()"""
+
+
+class DeviceResult:
+    """Deferred outcome of a check on one device, or of one of its sub-steps"""
+
+    def __init__(self, name):
+        self.name = name
+        # ordered log records, printed objects and nested DeviceResults
+        self.entries = []
+        self.result = "passed"
+        self.reason = None
+        self.exception = None
+        # wall time of the check, set by run_check
+        self.seconds = None
+
+    @property
+    def passed(self):
+        return self.result == "passed"
+
+    def info(self, msg):
+        self.entries.append(("log", logging.INFO, msg))
+
+    def error(self, msg):
+        self.entries.append(("log", logging.ERROR, msg))
+
+    def pprint(self, obj):
+        self.entries.append(("pprint", obj))
+
+    def failed(self, reason=None):
+        """Mark the result failed and end the check, mirroring step.failed()"""
+        self.result = "failed"
+        self.reason = reason
+        raise StepFailed(reason)
+
+    def start(self, name):
+        """Open a nested result, mirroring step.start(name, continue_=True)"""
+        child = DeviceResult(name)
+        self.entries.append(child)
+        return child
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # like continue_=True: a failing sub-step does not end its parent
+        if exc_type is None or exc_type is StepFailed:
+            return True
+        if issubclass(exc_type, Exception):
+            self.result = "errored"
+            self.exception = exc
+            return True
+        return False
+
+    def replay(self, step):
+        """Replay the recorded outcome into a pyATS step"""
+        for entry in self.entries:
+            if isinstance(entry, DeviceResult):
+                with step.start(entry.name, continue_=True) as sub_step:
+                    entry.replay(sub_step)
+            elif entry[0] == "log":
+                logger.log(entry[1], entry[2])
+            else:
+                pprint(entry[1])
+        if self.exception is not None:
+            raise self.exception
+        if self.result == "failed":
+            step.failed(self.reason)
+
+    def to_dict(self):
+        """JSON-friendly copy of a passed or failed result, see from_dict()"""
+        entries = [
+            entry.to_dict() if isinstance(entry, DeviceResult) else list(entry)
+            for entry in self.entries
+        ]
+        return {"name": self.name, "result": self.result, "reason": self.reason, "entries": entries}
+
+    @classmethod
+    def from_dict(cls, data):
+        result = cls(data["name"])
+        result.result = data["result"]
+        result.reason = data["reason"]
+        result.entries = [
+            cls.from_dict(entry) if isinstance(entry, dict) else tuple(entry)
+            for entry in data["entries"]
+        ]
+        return result
+
+
+def run_check(check, device, done=None):
+    """Run ``check(device, result)`` and return its DeviceResult
+
+    ``done(device, result)`` is called as soon as the check completes.
+    """
+    start = time.perf_counter()
+    with DeviceResult(device.name) as result:
+        check(device, result)
+    result.seconds = time.perf_counter() - start
+    if done is not None:
+        done(device, result)
+    return result
+
+
+def run_per_device(check, devices, workers=1, done=None):
+    """Run a check for every device with at most ``workers`` in parallel
+
+    Returns a dict of device name to DeviceResult in the order the devices
+    were given. With a single worker the checks run in the calling thread.
+    ``done(device, result)`` is called from the worker thread as each check
+    completes.
+    """
+    devices = list(devices)
+    if workers <= 1 or len(devices) <= 1:
+        return {device.name: run_check(check, device, done) for device in devices}
+    workers = min(workers, len(devices))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="check") as pool:
+        results = pool.map(lambda device: run_check(check, device, done), devices)
+        return {result.name: result for result in results}
+
+
+def run_steps(
+    steps,
+    testbed,
+    title,
+    check,
+    snapshot,
+    device_workers,
+    plan,
+    metrics,
+    deadlines,
+    state,
+    sink,
+    name,
+):
+    """Run a device check on every device and replay it into one step each
+
+    Devices which are not connected, or which timed out earlier in the run
+    and failed then, in test_connection or an earlier test, are skipped
+    without being checked. Unchanged devices of an incremental run replay
+    their cached verdict.
+    """
+    start = time.perf_counter()
+    reused = state.reused if state is not None else ()
+
+    def done(device, result):
+        # called from the worker thread as soon as the device is checked
+        metrics.record(device.name, "check", name, result.seconds)
+        if state is not None and device.connected:
+            state.put(device.name, name, result)
+        if isinstance(result.exception, DeadlineExceeded):
+            # missed its deadline in this test, after the collection (a
+            # command missing from the snapshot, or the job budget running
+            # out): fail it here, the later tests skip it
+            result.result, result.reason = "failed", str(result.exception)
+            result.exception = None
+        compiled = plan.get(name, device.os)
+        if sink is not None and compiled is not None:
+            raw = None
+            if not result.passed:
+                entry = snapshot.get(device.name, compiled.command)
+                raw = entry and entry["raw"]
+            sink.result(device, name, result, raw)
+
+    # Check the devices a chunk at a time, so only the results of one chunk
+    # are held until they are replayed, however large the testbed
+    items = list(testbed.devices.items())
+    chunk = max(64, 16 * device_workers)
+    for index in range(0, len(items), chunk):
+        # Run the device checks against the collected snapshot, in parallel
+        # when device_workers > 1
+        devices = [
+            snapshot.device(device)
+            for device_name, device in items[index:index + chunk]
+            if device.connected
+            and device_name not in deadlines.timed_out
+            and device_name not in reused
+        ]
+        results = run_per_device(check, devices, device_workers, done)
+        # Loop over every device of the chunk, replaying each result in order
+        for device_name, device in items[index:index + chunk]:
+            with steps.start(title.format(device_name), continue_=True) as step:
+                result = results.pop(device_name, None)
+                if device_name in reused:
+                    checked = time.strftime(
+                        "%Y-%m-%d %H:%M:%S", time.localtime(state.checked_at(device_name))
+                    )
+                    logger.info(
+                        f"{device_name} unchanged, reusing the verdict checked at {checked}"
+                    )
+                    result = state.verdict(device_name, name)
+                    if sink is not None and plan.get(name, device.os) is not None:
+                        sink.result(device, name, result, cached=True)
+                    result.replay(step)
+                elif result is None:
+                    if device_name in deadlines.timed_out:
+                        reason = f"{device_name} timed out: {deadlines.timed_out[device_name]}"
+                    else:
+                        reason = f"{device_name} is not connected"
+                    if sink is not None and plan.get(name, device.os) is not None:
+                        sink.skipped(device, name, reason)
+                    step.skipped(reason)
+                else:
+                    result.replay(step)
+    # wall time of the test, for the timing report
+    metrics.sections[f"test_{name}"] = time.perf_counter() - start
@@ -0,0 +1,60 @@
+"""
+sharding.py
+
+Split the devices of a job into shards run as separate easypy tasks
+
+"""
+SHARD_BY = ("count", "os", "site")
+
+
+def device_group(device, by):
+    """Grouping key of a device: its OS, its site or nothing for by="count"
+
+    The site is taken from the device's custom data (``custom: site: ...``
+    in the testbed file).
+    """
+    if by == "os":
+        return device.os
+    if by == "site":
+        custom = getattr(device, "custom", None) or {}
+        return custom.get("site", "unknown")
+    return None
+
+
+def split(names, shards, groups=None):
+    """Split device names into at most ``shards`` lists
+
+    Without ``groups`` the names are dealt into equally sized, contiguous
+    shards. With ``groups`` (name -> key) devices sharing a key stay in the
+    same shard, the largest groups being placed first on the least loaded
+    shard. Empty shards are dropped.
+    """
+    names = list(names)
+    shards = max(1, shards)
+    if groups is None:
+        size, extra = divmod(len(names), shards)
+        result, start = [], 0
+        for index in range(shards):
+            end = start + size + (index < extra)
+            result.append(names[start:end])
+            start = end
+        return [shard for shard in result if shard]
+
+    by_key = {}
+    for name in names:
+        by_key.setdefault(groups[name], []).append(name)
+    result = [[] for _ in range(min(shards, len(by_key)))]
+    for members in sorted(by_key.values(), key=len, reverse=True):
+        min(result, key=len).extend(members)
+    return [shard for shard in result if shard]
+
+
+def split_devices(devices, shards, by="count"):
+    """Split pyATS devices into lists of device names, see split()"""
+    devices = list(devices)
+    names = [device.name for device in devices]
+    if by == "count":
+        return split(names, shards)
+    if by not in SHARD_BY:
+        raise ValueError(f"cannot shard by {by!r}, expected one of {', '.join(SHARD_BY)}")
+    return split(names, shards, {device.name: device_group(device, by) for device in devices})
@@ -0,0 +1,104 @@
+"""
+sink.py
+
+Streaming JSON Lines sink of the device check results
+
+Every device check writes one compact record the moment it completes, so
+the results of a run are on disk as it goes and nothing has to be kept in
+memory until the end. Passed checks are a single short line; failed and
+errored ones also carry their error messages and the raw output of the
+check command, zlib-compressed and base64-encoded when asked to.
+
+    {"time": 1760000000.0, "device": "r1", "os": "ios", "check": "cpu_util",
+     "result": "failed", "seconds": 0.0002, "reason": "cpu_util is bad",
+     "messages": ["r1, kernel 50.0, cpu_util is bad: True"], "raw": "..."}
+
+A path ending in .gz writes a gzipped file.
+
+"""
+import base64
+import gzip
+import json
+import logging
+import threading
+import time
+import zlib
+
+from runner import DeviceResult
+
+# create a logger for this module
+logger = logging.getLogger(__name__)
+
+
+def messages(result):
+    """Error messages of a DeviceResult and its sub-steps, in order"""
+    found = []
+    for entry in result.entries:
+        if isinstance(entry, DeviceResult):
+            found.extend(messages(entry))
+            if entry.result != "passed":
+                found.append(f"{entry.name}: {entry.result}")
+        elif entry[0] == "log" and entry[1] >= logging.ERROR:
+            found.append(entry[2])
+    return found
+
+
+class ResultSink:
+    """Append-only JSON Lines file of check results, safe across threads"""
+
+    def __init__(self, path, compress_raw=False):
+        self.path = path
+        self.compress_raw = compress_raw
+        self.records = 0
+        self._lock = threading.Lock()
+        if path.endswith(".gz"):
+            self._file = gzip.open(path, "at")
+        else:
+            self._file = open(path, "a", buffering=1)
+
+    def write(self, record):
+        line = json.dumps(record, separators=(",", ":"), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self.records += 1
+
+    def result(self, device, check, result, raw=None, **extra):
+        """Write the record of a DeviceResult; ``raw`` is only kept if it did not pass"""
+        record = {
+            "time": round(time.time(), 3),
+            "device": device.name,
+            "os": device.os,
+            "check": check,
+            "result": result.result,
+        }
+        if result.seconds is not None:
+            record["seconds"] = round(result.seconds, 6)
+        reason = result.reason or (str(result.exception) if result.exception else None)
+        if reason:
+            record["reason"] = reason
+        if result.result != "passed":
+            record["messages"] = messages(result)
+            if raw is not None:
+                if self.compress_raw:
+                    record["raw_zlib"] = base64.b64encode(zlib.compress(raw.encode())).decode()
+                else:
+                    record["raw"] = raw
+        record.update(extra)
+        self.write(record)
+
+    def skipped(self, device, check, reason):
+        self.write(
+            {
+                "time": round(time.time(), 3),
+                "device": device.name,
+                "os": device.os,
+                "check": check,
+                "result": "skipped",
+                "reason": reason,
+            }
+        )
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+        logger.info(f"{self.records} result record(s) written to {self.path}")
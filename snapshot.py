@@ -0,0 +1,175 @@
+"""
+snapshot.py
+
+Per-device command snapshot cache
+
+CommonSetup takes every command the enabled checks need for each device OS
+from the compiled check plan, sends each unique command once per device and
+keeps the raw and parsed output here. The testcases
+then evaluate against SnapshotDevice views, which answer execute/parse from
+the cache instead of going back to the device.
+
+"""
+import gzip
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# create a logger for this module
+logger = logging.getLogger(__name__)
+
+
+class CollectionError(Exception):
+    """A command failed while the snapshot was collected"""
+
+
+class SnapshotCache:
+    """Raw and parsed command output per device and command
+
+    Entries are dicts with ``raw``, ``parsed``, ``error`` and ``time`` keys.
+    With a ``path`` the cache is loaded from and saved to a gzipped JSON file,
+    and entries younger than ``ttl`` seconds are reused instead of collected
+    again, e.g. by several runs within the same job.
+    """
+
+    def __init__(self, path=None, ttl=0, wrap=None):
+        self.path = path
+        self.ttl = ttl
+        # optional device wrapper applied before any command is sent,
+        # e.g. replay.RecordingDevice
+        self.wrap = wrap
+        self.entries = {}
+        if path and ttl and os.path.exists(path):
+            self.load()
+
+    def load(self):
+        try:
+            with gzip.open(self.path, "rt") as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable snapshot cache {self.path}: {e}")
+            self.entries = {}
+
+    def save(self):
+        if not self.path:
+            return
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with gzip.open(tmp, "wt") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp, self.path)
+
+    def get(self, device_name, command):
+        """Cached entry for a command, or None if missing or expired"""
+        entry = self.entries.get(device_name, {}).get(command)
+        if entry is None:
+            return None
+        if self.ttl and time.time() - entry["time"] > self.ttl:
+            return None
+        return entry
+
+    def put(self, device_name, command, raw=None, parsed=None, error=None):
+        entry = {"raw": raw, "parsed": parsed, "error": error, "time": time.time()}
+        self.entries.setdefault(device_name, {})[command] = entry
+        return entry
+
+    def collect_device(self, device, commands):
+        """Send the commands (command -> parse) not cached yet to one device
+
+        Every command is sent once, on its own: a failing command only fails
+        its own entry, and parsed commands are parsed from their raw output.
+        Returns the number of commands actually sent.
+        """
+        missing = []
+        for command, parse in commands.items():
+            entry = self.get(device.name, command)
+            if entry is None or entry["error"] is not None or entry["raw"] is None:
+                missing.append(command)
+            elif parse and entry["parsed"] is None:
+                self._parse(device, command, entry["raw"])
+        for command in missing:
+            try:
+                raw = device.execute(command)
+            except Exception as e:
+                logger.error(f"{device.name}, '{command}' failed during collection: {e}")
+                self.put(device.name, command, error=f"{type(e).__name__}: {e}")
+                continue
+            if commands[command]:
+                self._parse(device, command, raw)
+            else:
+                self.put(device.name, command, raw=raw)
+        return len(missing)
+
+    def _parse(self, device, command, raw):
+        try:
+            parsed = device.parse(command, output=raw)
+        except Exception as e:
+            logger.error(f"{device.name}, '{command}' failed to parse during collection: {e}")
+            self.put(device.name, command, raw=raw, error=f"{type(e).__name__}: {e}")
+        else:
+            self.put(device.name, command, raw=raw, parsed=parsed)
+
+    def collect(self, devices, plan, workers=1):
+        """Collect the snapshot of every connected device for a check Plan
+
+        Returns the total number of commands sent.
+        """
+        devices = [self._wrap(device) for device in devices if device.connected]
+        if not devices:
+            return 0
+        workers = max(1, min(workers, len(devices)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="collect") as pool:
+            return sum(
+                pool.map(
+                    lambda device: self.collect_device(device, plan.commands_for(device.os)),
+                    devices,
+                )
+            )
+
+    def device(self, device):
+        return SnapshotDevice(self._wrap(device), self)
+
+    def _wrap(self, device):
+        return self.wrap(device) if self.wrap is not None else device
+
+
+class SnapshotDevice:
+    """Device view answering execute/parse from the snapshot cache
+
+    Commands missing from the cache fall through to the real device and are
+    cached, so a check asking for something unplanned still works. Every other
+    attribute is the real device's.
+    """
+
+    def __init__(self, device, cache):
+        self._device = device
+        self._cache = cache
+
+    def __getattr__(self, name):
+        return getattr(self._device, name)
+
+    def _entry(self, command):
+        entry = self._cache.get(self._device.name, command)
+        if entry is not None and entry["error"] is not None:
+            raise CollectionError(f"'{command}' failed during collection: {entry['error']}")
+        return entry
+
+    def execute(self, command, **kwargs):
+        entry = self._entry(command)
+        if entry is not None and entry["raw"] is not None:
+            return entry["raw"]
+        raw = self._device.execute(command, **kwargs)
+        self._cache.put(self._device.name, command, raw=raw)
+        return raw
+
+    def parse(self, command, **kwargs):
+        entry = self._entry(command)
+        if entry is not None and entry["parsed"] is not None:
+            return entry["parsed"]
+        if entry is not None and entry["raw"] is not None:
+            parsed = self._device.parse(command, output=entry["raw"])
+        else:
+            parsed = self._device.parse(command, **kwargs)
+        self._cache.put(self._device.name, command, raw=entry and entry["raw"], parsed=parsed)
+        return parsed
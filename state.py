@@ -0,0 +1,135 @@
+"""
+state.py
+
+Device state fingerprints and cached verdicts for incremental runs
+
+A fingerprint is what the cheap checks tell about a device: its uptime,
+from the last_reload command, and a hash of its interface states, from the
+updown_validation command. A device is unchanged when its interfaces hash
+the same and its uptime has not gone down (no reload) since the last run.
+Unchanged devices whose verdicts are younger than the staleness window get
+those verdicts replayed instead of being collected and checked again.
+
+The state is kept in a gzipped JSON file, like the snapshot cache.
+
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import time
+
+from runner import DeviceResult
+
+# create a logger for this module
+logger = logging.getLogger(__name__)
+
+# checks whose command outputs make up the fingerprint
+FINGERPRINT_CHECKS = ("last_reload", "updown_validation")
+
+
+def fingerprint(plan, device):
+    """Fingerprint of a device from its collected outputs, or None
+
+    ``plan`` is the compiled plan of FINGERPRINT_CHECKS. Returns None when
+    the OS has none of them or an output cannot be read, so the device is
+    always checked in full.
+    """
+    result = {}
+    try:
+        reload_check = plan.get("last_reload", device.os)
+        if reload_check is not None:
+            result["uptime"] = min(value for label, value in reload_check.values(device))
+        updown_check = plan.get("updown_validation", device.os)
+        if updown_check is not None:
+            table = updown_check.values(device)
+            states = sorted(f"{table.names[i]} {table.state(i)}" for i in range(len(table)))
+            result["interfaces"] = hashlib.sha1("\n".join(states).encode()).hexdigest()
+    except Exception as e:
+        logger.warning(f"{device.name}, no fingerprint: {e}")
+        return None
+    return result or None
+
+
+class StateStore:
+    """Fingerprints and verdicts of every device from the previous runs
+
+    ``staleness`` is how many seconds the verdicts of an unchanged device
+    are reused for, ``full_every`` forces every Nth run to check every
+    device (0 never forces one).
+    """
+
+    def __init__(self, path, staleness=3600, full_every=0):
+        self.path = path
+        self.staleness = staleness
+        self.full_every = full_every
+        self.runs = 0
+        # name -> {"fingerprint": ..., "checked": time, "verdicts": {check: result}}
+        self.devices = {}
+        self.full = False
+        # devices of this run reusing their cached verdicts
+        self.reused = set()
+        if os.path.exists(path):
+            self.load()
+
+    def load(self):
+        try:
+            with gzip.open(self.path, "rt") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable state file {self.path}: {e}")
+            return
+        self.runs = data["runs"]
+        self.devices = data["devices"]
+
+    def save(self):
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with gzip.open(tmp, "wt") as f:
+            json.dump({"runs": self.runs, "devices": self.devices}, f)
+        os.replace(tmp, self.path)
+
+    def begin(self):
+        """Count a new run, returns whether it is a forced full refresh"""
+        self.runs += 1
+        self.full = bool(self.full_every) and self.runs % self.full_every == 0
+        return self.full
+
+    def unchanged(self, name, new, checks):
+        """Whether the cached verdicts of every check can be reused for a device"""
+        entry = self.devices.get(name)
+        if self.full or new is None or entry is None:
+            return False
+        old = entry["fingerprint"] or {}
+        if time.time() - entry["checked"] > self.staleness:
+            return False
+        if any(check not in entry["verdicts"] for check in checks):
+            return False
+        if new.get("interfaces") != old.get("interfaces"):
+            return False
+        # the uptime only goes down when the device reloaded
+        if "uptime" in new and new["uptime"] < old.get("uptime", 0):
+            return False
+        entry["fingerprint"] = new
+        self.reused.add(name)
+        return True
+
+    def refresh(self, name, new):
+        """Start a full check of a device, dropping its cached verdicts"""
+        self.devices[name] = {"fingerprint": new, "checked": time.time(), "verdicts": {}}
+
+    def verdict(self, name, check):
+        """Cached DeviceResult of a check, or None"""
+        entry = self.devices.get(name)
+        if entry is None or check not in entry["verdicts"]:
+            return None
+        return DeviceResult.from_dict(entry["verdicts"][check])
+
+    def put(self, name, check, result):
+        """Cache the result of a full check, unless it errored"""
+        entry = self.devices.get(name)
+        if entry is not None and result.exception is None and result.result != "errored":
+            entry["verdicts"][check] = result.to_dict()
+
+    def checked_at(self, name):
+        return self.devices[name]["checked"]
@@ -0,0 +1,52 @@
+"""
+conftest.py
+
+Make the modules next to the job file importable from the tests, and record
+the steps of a test without pyATS
+
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from runner import StepFailed  # noqa: E402
+
+
+class Step:
+    """Just enough of a pyATS step to record the outcome of every step"""
+
+    def __init__(self, name="steps"):
+        self.name = name
+        self.result = "passed"
+        self.reason = None
+        self.children = {}
+
+    def start(self, name, continue_=False):
+        self.children[name] = Step(name)
+        return self.children[name]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return exc_type is StepFailed
+
+    def failed(self, reason=None):
+        self.result, self.reason = "failed", reason
+        raise StepFailed(reason)
+
+    def skipped(self, reason=None):
+        self.result, self.reason = "skipped", reason
+        raise StepFailed(reason)
+
+    def results(self):
+        """Result of every child step, by name"""
+        return {name: step.result for name, step in self.children.items()}
+
+
+@pytest.fixture
+def steps():
+    return Step()
@@ -0,0 +1,153 @@
+"""
+test_broker.py
+
+Brokered devices, through a running broker or falling back to direct connects
+
+"""
+import os
+import threading
+import time
+
+import pytest
+
+import broker as broker_module
+from broker import Broker, BrokerClient, BrokeredDevice, BrokerError
+from mock import RAW, MockDevice, MockTestbed, make_testbed
+
+
+def test_falls_back_to_a_direct_connect_without_broker(tmp_path):
+    device = MockDevice("r1", "asa")
+    brokered = BrokeredDevice(device, BrokerClient(str(tmp_path / "none.sock")))
+    brokered.connect(connection_timeout=5)
+    assert brokered.connected and brokered._direct
+    assert device.connected
+    assert brokered.execute("show cpu usage").startswith("CPU utilization")
+    assert device.commands_sent == 1
+    brokered.disconnect()
+    assert not device.connected
+
+
+@pytest.fixture
+def broker(tmp_path):
+    broker = Broker(make_testbed(3), max_sessions=2)
+    path = str(tmp_path / "broker.sock")
+    threading.Thread(target=broker.serve, args=(path,), daemon=True).start()
+    client = BrokerClient(path)
+    for _ in range(100):
+        if client.available():
+            break
+        time.sleep(0.01)
+    yield broker, client
+    broker.close()
+
+
+def test_commands_go_through_the_broker_session(broker):
+    broker, client = broker
+    local = MockDevice("ios-00000", "ios")
+    brokered = client.testbed(make_testbed(1)).devices["ios-00000"]
+    brokered._device = local
+    brokered.connect()
+    assert not brokered._direct and not local.connected
+    assert brokered.execute("show memory") == RAW["show memory"]
+    assert broker.testbed.devices["ios-00000"].commands_sent == 1
+    assert local.commands_sent == 0
+    # parsed locally from the raw output of the broker
+    assert brokered.parse("sh proc cpu") == {"kernel_percent": 3.0}
+    # the session stays warm after a disconnect
+    brokered.disconnect()
+    assert "ios-00000" in broker.sessions
+
+
+def test_device_unknown_to_the_broker_connects_directly(broker):
+    broker, client = broker
+    device = MockDevice("r9", "ios")
+    brokered = BrokeredDevice(device, client)
+    brokered.connect()
+    assert brokered._direct and device.connected
+
+
+def test_least_recently_used_session_makes_room(broker):
+    broker, client = broker
+    for name in ("ios-00000", "nxos-00001", "iosxe-00002"):
+        client.request("connect", device=name)
+    assert sorted(broker.sessions) == ["iosxe-00002", "nxos-00001"]
+    assert not broker.testbed.devices["ios-00000"].connected
+
+
+def test_refuses_to_replace_a_running_broker(broker):
+    broker, client = broker
+    with pytest.raises(BrokerError, match="already serves"):
+        Broker(make_testbed(1)).serve(client.path)
+    assert client.available()
+
+
+def test_refuses_a_socket_directory_other_users_can_enter(tmp_path):
+    shared = tmp_path / "shared"
+    shared.mkdir(mode=0o755)
+    os.chmod(shared, 0o755)
+    with pytest.raises(BrokerError, match="not private"):
+        Broker(make_testbed(1)).serve(str(shared / "broker.sock"))
+
+
+def test_never_trusts_a_socket_of_another_user(broker, monkeypatch):
+    broker, client = broker
+    monkeypatch.setattr(broker_module.os, "getuid", lambda: os.stat(client.path).st_uid + 1)
+    assert not client.available()
+
+
+class SlowLogoutDevice(MockDevice):
+    def disconnect(self):
+        time.sleep(0.5)
+        super().disconnect()
+
+
+def test_slow_logouts_do_not_hold_up_other_devices():
+    testbed = MockTestbed([SlowLogoutDevice("slow", "ios"), MockDevice("fast", "ios")])
+    broker = Broker(testbed, idle_timeout=0)
+    with broker.using("slow"):
+        pass
+    sweep = threading.Thread(target=broker.sweep)
+    sweep.start()
+    time.sleep(0.1)
+    start = time.monotonic()
+    broker.execute("fast", "show cpu")
+    assert time.monotonic() - start < 0.3
+    # a new session of the device waits for the old one to log out
+    with broker.using("slow") as session:
+        assert session.device.connected
+    sweep.join()
+    assert sorted(broker.sessions) == ["fast", "slow"]
+
+
+
+class BusyDevice(MockDevice):
+    """MockDevice recording the disconnects that cut a command short"""
+
+    def __init__(self, name, os_name, **kwargs):
+        super().__init__(name, os_name, **kwargs)
+        self.busy = False
+        self.cut_short = 0
+
+    def execute(self, command, **kwargs):
+        self.busy = True
+        try:
+            return super().execute(command, **kwargs)
+        finally:
+            self.busy = False
+
+    def disconnect(self):
+        self.cut_short += self.busy
+        super().disconnect()
+
+
+def test_close_waits_for_the_running_command():
+    device = BusyDevice("r1", "ios", latency=0.3)
+    broker = Broker(MockTestbed([device]))
+    broker.execute("r1", "show cpu")
+    command = threading.Thread(target=broker.execute, args=("r1", "show cpu"))
+    command.start()
+    time.sleep(0.1)
+    broker.close()
+    command.join()
+    assert device.cut_short == 0
+    assert not device.connected and not broker.sessions
@@ -0,0 +1,48 @@
+"""
+test_checks.py
+
+Compiling the check spec into a per-OS plan
+
+"""
+import pytest
+
+from checks import SPEC, compile_plan
+from mock import MockDevice
+
+
+def test_updown_validation_covers_ios():
+    plan = compile_plan()
+    for os_name in ("ios", "iosxe", "nxos", "asa", "fxos"):
+        assert plan.get("updown_validation", os_name) is not None
+    table = plan.get("updown_validation", "ios").values(MockDevice("r1", "ios", interfaces=3))
+    assert len(table) == 3
+
+
+def test_commands_are_merged_per_os():
+    plan = compile_plan(checks=["last_reload", "cpu_util", "memory_util", "updown_validation"])
+    assert list(plan.commands_for("asa")) == [
+        "show version",
+        "show cpu usage",
+        "show memory",
+        "show interface ip brief",
+    ]
+    assert plan.commands_for("nxos")["show version"] is True
+    assert plan.commands_for("nxos")["show system resource"] is False
+    assert plan.commands_for("unknown") == {}
+
+
+def test_unknown_check_is_refused():
+    with pytest.raises(ValueError, match="not in the check spec"):
+        compile_plan(checks=["cpu_util", "fan_speed"])
+
+
+def test_unknown_extractor_is_refused():
+    spec = {"cpu_util": dict(SPEC["cpu_util"], os={"asa": {"command": "x", "extract": "nope"}})}
+    with pytest.raises(ValueError, match="unknown extractor 'nope'"):
+        compile_plan(spec, ["cpu_util"])
+
+
+def test_unknown_comparison_is_refused():
+    spec = {"cpu_util": dict(SPEC["cpu_util"], compare="about")}
+    with pytest.raises(ValueError, match="unknown comparison 'about'"):
+        compile_plan(spec, ["cpu_util"])
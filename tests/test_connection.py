@@ -0,0 +1,80 @@
+"""
+test_connection.py
+
+Connect retries, backoff and failure isolation
+
+"""
+import time
+import types
+
+import pytest
+
+import connection
+from connection import connect_device, connect_devices
+
+
+class FlakyDevice:
+    """Device refusing its first ``failures`` connects"""
+
+    def __init__(self, name, failures=0):
+        self.name = name
+        self.failures = failures
+        self.connected = False
+        self.destroyed = 0
+
+    def connect(self, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError(f"{self.name} refused the connection")
+        self.connected = True
+
+    def destroy(self):
+        self.destroyed += 1
+        self.connected = False
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    # only the waits of connect_device, not those of the pool threads
+    delays = []
+    monkeypatch.setattr(
+        connection, "time", types.SimpleNamespace(sleep=delays.append, monotonic=time.monotonic)
+    )
+    return delays
+
+
+def test_connect_retries_with_exponential_backoff(sleeps):
+    device = FlakyDevice("r1", failures=2)
+    status = connect_device(device, retries=2, backoff=1.5)
+    assert status.connected and device.connected
+    assert status.attempts == 3
+    assert status.error is None
+    assert sleeps == [1.5, 3.0]
+    # every failed attempt drops its half-open connection
+    assert device.destroyed == 2
+
+
+def test_connect_gives_up_after_the_retries(sleeps):
+    device = FlakyDevice("r1", failures=10)
+    status = connect_device(device, retries=1, backoff=2.0)
+    assert not status.connected
+    assert status.attempts == 2
+    assert "refused" in status.error
+    # no wait after the last attempt
+    assert sleeps == [2.0]
+
+
+def test_failing_device_does_not_stop_the_others(sleeps):
+    devices = [
+        FlakyDevice("r1"),
+        FlakyDevice("r2", failures=10),
+        FlakyDevice("r3"),
+    ]
+    statuses = connect_devices(devices, workers=2, retries=0)
+    assert list(statuses) == ["r1", "r2", "r3"]
+    assert [status.connected for status in statuses.values()] == [True, False, True]
+    assert devices[0].connected and devices[2].connected
+
+
+def test_connect_no_devices():
+    assert connect_devices([]) == {}
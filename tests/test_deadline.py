@@ -0,0 +1,64 @@
+"""
+test_deadline.py
+
+Deadlines of the device calls
+
+"""
+import time
+
+import pytest
+
+from checks import compile_plan
+from deadline import DeadlineExceeded, Deadlines
+from mock import make_testbed
+from snapshot import SnapshotCache
+
+
+def test_no_limit_without_budget_or_max_timeout():
+    deadlines = Deadlines()
+    deadlines.observe("r1", 2.0)
+    assert deadlines.timeout("r1") is None
+
+
+def test_max_timeout_until_a_latency_is_observed():
+    deadlines = Deadlines(max_timeout=60, min_timeout=1, factor=5)
+    assert deadlines.timeout("r1") == 60
+
+
+def test_timeout_adapts_to_the_observed_latency():
+    deadlines = Deadlines(max_timeout=60, min_timeout=1, factor=5, smoothing=0.5)
+    deadlines.observe("r1", 0.4)
+    assert deadlines.timeout("r1") == pytest.approx(2.0)
+    assert deadlines.timeout("r1", commands=4) == pytest.approx(8.0)
+    # never below min_timeout nor above max_timeout
+    deadlines.observe("fast", 0.01)
+    assert deadlines.timeout("fast") == 1
+    deadlines.observe("slow", 30.0)
+    assert deadlines.timeout("slow") == 60
+    # smoothed, not replaced, by later observations
+    deadlines.observe("r1", 1.2, commands=2)
+    assert deadlines.latency["r1"] == pytest.approx(0.5)
+
+
+def test_timeout_never_exceeds_the_budget_left():
+    deadlines = Deadlines(budget=5, max_timeout=60)
+    assert deadlines.timeout("r1") <= 5
+    assert Deadlines(budget=5).timeout("r1") <= 5
+
+
+def test_hung_device_times_out_during_the_collection():
+    testbed = make_testbed(4, latency=0.01, slow=1, slow_latency=5)
+    for device in testbed:
+        device.connected = True
+    deadlines = Deadlines(max_timeout=0.5, min_timeout=0.1)
+    snapshot = SnapshotCache(wrap=deadlines.device)
+    start = time.monotonic()
+    snapshot.collect(testbed.devices.values(), compile_plan(), workers=4)
+    # the hung device is abandoned at its deadline, not waited for
+    assert time.monotonic() - start < 2
+    assert list(deadlines.timed_out) == ["asa-00003"]
+    assert "no answer within 0.5s" in deadlines.timed_out["asa-00003"]
+    for name in ("ios-00000", "nxos-00001", "iosxe-00002"):
+        assert snapshot.get(name, "sh proc cpu")["error"] is None
+    with pytest.raises(DeadlineExceeded):
+        deadlines.check("asa-00003")
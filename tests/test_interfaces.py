@@ -0,0 +1,50 @@
+"""
+test_interfaces.py
+
+Interface selection and summary of the up/down check
+
+"""
+from interfaces import InterfaceTable
+
+
+def make_table():
+    table = InterfaceTable()
+    table.add("GigabitEthernet0/0", "up", "up")
+    table.add("GigabitEthernet0/1", "down", "down")
+    table.add("GigabitEthernet0/2", "administratively down", "down")
+    table.add("Management0/0", "up", "down")
+    table.add("Eth1/1", "up")
+    return table
+
+
+def test_select_all_by_default():
+    assert make_table().select() == [0, 1, 2, 3, 4]
+
+
+def test_select_include_exclude_and_admin_down():
+    table = make_table()
+    assert table.select(include="^Gigabit") == [0, 1, 2]
+    assert table.select(exclude="^(Management|Eth)") == [0, 1, 2]
+    assert table.select(include="Eth", exclude="0/1$") == [0, 2, 4]
+    assert table.select(ignore_admin_down=True) == [0, 1, 3, 4]
+
+
+def test_summary_counts_and_failing_states():
+    table = make_table()
+    summary = table.summary(table.select(ignore_admin_down=True))
+    assert summary == {
+        "total": 5,
+        "checked": 4,
+        "up": 2,
+        "down": 2,
+        "failing": [
+            ("GigabitEthernet0/1", "down, down"),
+            ("Management0/0", "up, down"),
+        ],
+    }
+
+
+def test_status_only_interfaces_are_up_on_status():
+    table = make_table()
+    assert table.is_up(4)
+    assert table.state(4) == "up"
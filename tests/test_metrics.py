@@ -0,0 +1,58 @@
+"""
+test_metrics.py
+
+Timing of device calls and the Prometheus textfile of the report
+
+"""
+import re
+import time
+
+from metrics import Metrics
+
+
+def test_every_call_is_counted_once_per_metric(tmp_path):
+    metrics = Metrics()
+    metrics.record("r1", "execute", "show version", 0.5, 100)
+    metrics.record("r1", "execute", "show cpu", 0.25, 10)
+    metrics.record("r2", "execute", "show version", 1.0, 100)
+    metrics.record("r1", "check", "cpu_util", 0.001)
+    path = tmp_path / "network_test.prom"
+    metrics.write_textfile(str(path))
+
+    counts, label_sets = {}, {}
+    for line in path.read_text().splitlines():
+        match = re.match(r"(\w+)_count\{(.*)\} (\S+)$", line)
+        if match:
+            name, labels, value = match.groups()
+            counts[name] = counts.get(name, 0) + int(value)
+            label_sets.setdefault(name, set()).add(
+                tuple(sorted(label.split("=")[0] for label in labels.split(",")))
+            )
+    assert counts == {
+        "network_test_duration_seconds": 4,
+        "network_test_command_duration_seconds": 4,
+    }
+    assert label_sets == {
+        "network_test_duration_seconds": {("phase",)},
+        "network_test_command_duration_seconds": {("command", "phase")},
+    }
+
+
+class SlowCommandDevice:
+    """Device taking 0.1s to answer "show slow" and no time for the others"""
+
+    name = "r1"
+
+    def execute(self, command, **kwargs):
+        if command == "show slow":
+            time.sleep(0.1)
+        return f"{command} output"
+
+
+def test_commands_of_a_list_are_timed_one_by_one():
+    metrics = Metrics()
+    outputs = metrics.timed(SlowCommandDevice()).execute(["show slow", "show fast"])
+    assert outputs == {"show slow": "show slow output", "show fast": "show fast output"}
+    seconds = {command: elapsed for _, _, command, elapsed, _ in metrics.samples}
+    assert seconds["show slow"] >= 0.1
+    assert seconds["show fast"] < 0.05
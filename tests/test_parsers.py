@@ -0,0 +1,80 @@
+"""
+test_parsers.py
+
+Fast-path parsers of the ASA and FXOS outputs
+
+"""
+import pytest
+
+import parsers
+from parsers import ParserError
+
+HEADER = "Interface                  IP-Address      OK? Method Status                Protocol\n"
+BRIEF = HEADER + (
+    "GigabitEthernet0/0         10.0.0.1        YES manual up                    up\n"
+    "GigabitEthernet0/1         10.0.0.2        YES manual up                    up\n"
+    "GigabitEthernet0/2         10.0.0.3        YES manual up                    up\n"
+)
+MEMORY = "Free memory: 5033431040 bytes (59%)\nUsed memory: 3556556800 bytes (41%)\n"
+CPU_USAGE = "CPU utilization for 5 seconds = 12%; 1 minute: 9%; 5 minutes: 7%\n"
+VERSION = "Cisco Adaptive Security Appliance Software Version 9.12\nasa up 10 days 3 hours\n"
+
+
+def test_interface_ip_brief():
+    rows = parsers.interface_ip_brief(BRIEF)
+    assert [row.interface for row in rows] == [f"GigabitEthernet0/{i}" for i in range(3)]
+    assert rows[0] == ("GigabitEthernet0/0", "10.0.0.1", "YES", "manual", "up", "up")
+
+
+def test_interface_ip_brief_status_with_spaces():
+    output = HEADER + "Management0/0   unassigned  YES unset  administratively down down\n"
+    (row,) = parsers.interface_ip_brief(output)
+    assert row.status == "administratively down"
+    assert row.protocol == "down"
+
+
+def test_interface_ip_brief_raw_terminal_lines():
+    rows = parsers.interface_ip_brief(BRIEF.replace("\n", "\r\n"))
+    assert [(row.interface, row.protocol) for row in rows] == [
+        (f"GigabitEthernet0/{i}", "up") for i in range(3)
+    ]
+
+
+def test_interface_ip_brief_without_rows():
+    assert parsers.interface_ip_brief("") == []
+    with pytest.raises(ParserError):
+        parsers.interface_ip_brief("% Invalid input detected at '^' marker.\n")
+
+
+def test_cpu_percentages():
+    assert parsers.cpu_percentages(CPU_USAGE) == [12.0, 9.0, 7.0]
+    assert parsers.cpu_percentages("CPU utilization for 5 seconds = 12.5%; 1 minute: 9%") == [
+        12.5,
+        9.0,
+    ]
+    with pytest.raises(ParserError):
+        parsers.cpu_percentages("% Invalid input detected at '^' marker.\n")
+
+
+def test_used_memory_percent():
+    assert parsers.used_memory_percent(MEMORY) == 41.0
+    assert parsers.used_memory_percent("Used memory: 3556556800 bytes (41.5%)\r\n") == 41.5
+    with pytest.raises(ParserError):
+        parsers.used_memory_percent("Free memory: 5033431040 bytes\n")
+    with pytest.raises(ParserError):
+        parsers.used_memory_percent("Used memory: 3556556800 bytes\nFree memory: (59%)\n")
+
+
+def test_uptime():
+    assert parsers.uptime(VERSION) == pytest.approx(10 + 3 / 24)
+    assert parsers.uptime_days("1 week, 2 days, 3 hours, 4 minutes") == pytest.approx(
+        9 + 3 / 24 + 4 / 1440
+    )
+    with pytest.raises(ParserError):
+        parsers.uptime("Cisco Adaptive Security Appliance Software Version 9.12\n")
+
+
+def test_parse_dispatches_by_os_and_command():
+    assert parsers.parse("fxos", "show cpu", "CPU 0 12%\nCPU 1 9%\n") == [12.0, 9.0]
+    with pytest.raises(ParserError):
+        parsers.parse("ios", "show cpu", "CPU 0 12%\nCPU 1 9%\n")
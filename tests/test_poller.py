@@ -0,0 +1,71 @@
+"""
+test_poller.py
+
+Ring buffers of the poller
+
+"""
+import time
+
+from checks import compile_plan
+from mock import MockDevice
+from poller import Poller, RingBuffer
+
+
+def test_ring_buffer_keeps_the_latest_values_in_order():
+    ring = RingBuffer(3)
+    assert len(ring) == 0
+    assert ring.latest() == []
+    for i in range(5):
+        ring.append(100.0 + i, float(i))
+    assert len(ring) == 3
+    assert ring.latest() == [2.0, 3.0, 4.0]
+    assert ring.latest(2) == [3.0, 4.0]
+    assert ring.latest(10) == [2.0, 3.0, 4.0]
+    assert ring.items() == [(102.0, 2.0), (103.0, 3.0), (104.0, 4.0)]
+
+
+def test_ring_buffer_before_wrapping():
+    ring = RingBuffer(4)
+    ring.append(1.0, 10.0)
+    ring.append(2.0, 20.0)
+    assert ring.latest() == [10.0, 20.0]
+    assert ring.items() == [(1.0, 10.0), (2.0, 20.0)]
+
+
+class DownDevice(MockDevice):
+    """MockDevice refusing every connect, counting them"""
+
+    def __init__(self, name, connect_latency=0.0):
+        super().__init__(name, "asa", connect_latency=connect_latency, fail_connect=True)
+        self.attempts = 0
+
+    def connect(self, **kwargs):
+        self.attempts += 1
+        super().connect(**kwargs)
+
+
+def test_dropped_devices_reconnect_in_parallel():
+    devices = [DownDevice(f"fw{i}", connect_latency=0.2) for i in range(4)]
+    poller = Poller(devices, compile_plan(checks=["cpu_util"]), workers=4)
+    start = time.monotonic()
+    poller.sample()
+    assert time.monotonic() - start < 0.5
+    assert [device.attempts for device in devices] == [1, 1, 1, 1]
+
+
+def test_devices_failing_to_reconnect_are_backed_off():
+    down = DownDevice("fw1")
+    up = MockDevice("fw2", "asa")
+    up.connected = True
+    poller = Poller([down, up], compile_plan(checks=["cpu_util"]), max_reconnect_skip=3)
+    attempts = []
+    for _ in range(12):
+        poller.sample()
+        attempts.append(down.attempts)
+    # retried after 1, 2, 4 and then every 4 samples
+    assert attempts == [1, 2, 2, 3, 3, 3, 3, 4, 4, 4, 4, 5]
+    assert len(poller.series) == 3
+    down.fail_connect = False
+    for _ in range(4):
+        poller.sample()
+    assert down.connected and "fw1" not in poller.reconnects
@@ -0,0 +1,53 @@
+"""
+test_replay.py
+
+Recording device outputs and replaying them offline
+
+"""
+import pytest
+
+from mock import MockDevice
+from replay import OutputStore, ReplayError, ReplayTestbed
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = OutputStore(str(tmp_path / "outputs.db"))
+    yield store
+    store.close()
+
+
+def test_recorded_outputs_replay_offline(store):
+    raw = store.recording(MockDevice("fw1", "asa")).execute("show cpu usage")
+    parsed = store.recording(MockDevice("r1", "ios")).parse("show version")
+
+    testbed = ReplayTestbed(store)
+    assert {name: device.os for name, device in testbed.devices.items()} == {
+        "fw1": "asa",
+        "r1": "ios",
+    }
+    device = testbed.devices["fw1"]
+    device.connect()
+    assert device.connected
+    assert device.execute("show cpu usage") == raw
+    assert device.execute(["show cpu usage"]) == {"show cpu usage": raw}
+    # no raw output recorded: the recorded parse is served
+    assert testbed.devices["r1"].parse("show version") == parsed
+    with pytest.raises(ReplayError):
+        device.execute("show memory")
+
+
+def test_replay_at_a_point_in_time(store):
+    store.add_device("fw1", "asa")
+    store.put("fw1", "show cpu usage", "execute", "old", at=100.0)
+    store.put("fw1", "show cpu usage", "execute", "new", at=200.0)
+    assert ReplayTestbed(store, at=150.0).devices["fw1"].execute("show cpu usage") == "old"
+    assert ReplayTestbed(store).devices["fw1"].execute("show cpu usage") == "new"
+    with pytest.raises(ReplayError):
+        ReplayTestbed(store, at=50.0).devices["fw1"].execute("show cpu usage")
+
+
+def test_replay_only_the_named_devices(store):
+    store.add_device("fw1", "asa")
+    store.add_device("fw2", "asa")
+    assert list(ReplayTestbed(store, names=["fw2", "gone"]).devices) == ["fw2"]
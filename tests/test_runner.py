@@ -0,0 +1,123 @@
+"""
+test_runner.py
+
+Deferred device check results and their replay into steps
+
+"""
+import json
+
+import pytest
+
+from checks import compile_plan
+from connection import connect_devices
+from deadline import Deadlines
+from metrics import Metrics
+from mock import MockDevice, MockTestbed, make_testbed
+from runner import DeviceResult, run_per_device, run_steps
+from sink import ResultSink
+from snapshot import SnapshotCache
+
+
+def check(device, step):
+    step.info(f"{device.name} checked")
+    with step.start("interfaces") as sub_step:
+        sub_step.error("Gi0/1 down")
+        sub_step.failed("1 interface(s) not up")
+    step.failed("interfaces down")
+
+
+def test_to_dict_from_dict_round_trip():
+    result = run_per_device(check, [type("Device", (), {"name": "r1"})()])["r1"]
+    copy = DeviceResult.from_dict(result.to_dict())
+    assert copy.to_dict() == result.to_dict()
+    assert (copy.name, copy.result, copy.reason) == ("r1", "failed", "interfaces down")
+    assert copy.entries[0] == ("log", 20, "r1 checked")
+    (sub_step,) = [entry for entry in copy.entries if isinstance(entry, DeviceResult)]
+    assert (sub_step.result, sub_step.reason) == ("failed", "1 interface(s) not up")
+
+
+def test_results_in_device_order_with_workers():
+    devices = [type("Device", (), {"name": f"r{i}"})() for i in range(20)]
+    results = run_per_device(check, devices, workers=4)
+    assert list(results) == [f"r{i}" for i in range(20)]
+
+
+@pytest.fixture
+def collected():
+    """Mock testbed with one hung device, connected and collected with deadlines"""
+    testbed = make_testbed(3, latency=0.01, slow=1, slow_latency=5, connect_latency=0.01)
+    connect_devices(testbed.devices.values(), retries=0)
+    deadlines = Deadlines(max_timeout=0.5, min_timeout=0.1)
+    plan = compile_plan()
+    snapshot = SnapshotCache(wrap=deadlines.device)
+    snapshot.collect(testbed.devices.values(), plan, workers=3)
+    return testbed, deadlines, plan, snapshot
+
+
+def check_cpu(plan):
+    def check(device, step):
+        for label, value, passed in plan.get("cpu_util", device.os).evaluate(device):
+            if not passed:
+                step.failed(f"{label} {value}")
+
+    return check
+
+
+def test_device_hung_during_collection_is_skipped_by_the_checks(collected, steps):
+    testbed, deadlines, plan, snapshot = collected
+    metrics = Metrics()
+    run_steps(
+        steps,
+        testbed,
+        "Test cpu util of {}",
+        check_cpu(plan),
+        snapshot,
+        1,
+        plan,
+        metrics,
+        deadlines,
+        None,
+        None,
+        "cpu_util",
+    )
+    assert steps.results() == {
+        "Test cpu util of ios-00000": "passed",
+        "Test cpu util of nxos-00001": "passed",
+        "Test cpu util of iosxe-00002": "skipped",
+    }
+    assert "timed out" in steps.children["Test cpu util of iosxe-00002"].reason
+    assert "test_cpu_util" in metrics.sections
+
+
+def test_unconnected_device_is_skipped_and_recorded(tmp_path, steps):
+    testbed = MockTestbed([MockDevice("r1", "ios"), MockDevice("r2", "ios", fail_connect=True)])
+    connect_devices(testbed.devices.values(), retries=0)
+    plan = compile_plan()
+    snapshot = SnapshotCache()
+    snapshot.collect(testbed.devices.values(), plan)
+    sink = ResultSink(str(tmp_path / "results.jsonl"))
+    run_steps(
+        steps,
+        testbed,
+        "Test cpu util of {}",
+        check_cpu(plan),
+        snapshot,
+        1,
+        plan,
+        Metrics(),
+        Deadlines(),
+        None,
+        sink,
+        "cpu_util",
+    )
+    sink.close()
+    assert steps.results() == {
+        "Test cpu util of r1": "passed",
+        "Test cpu util of r2": "skipped",
+    }
+    records = [json.loads(line) for line in (tmp_path / "results.jsonl").read_text().splitlines()]
+    assert [(record["device"], record["result"]) for record in records] == [
+        ("r1", "passed"),
+        ("r2", "skipped"),
+    ]
+    assert records[1]["reason"] == "r2 is not connected"
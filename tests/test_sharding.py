@@ -0,0 +1,52 @@
+"""
+test_sharding.py
+
+Splitting devices into shards
+
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from sharding import split, split_devices
+
+
+def make_devices(count, os_names=("ios", "nxos", "iosxe", "asa", "fxos")):
+    return [
+        SimpleNamespace(name=f"r{i}", os=os_names[i % len(os_names)]) for i in range(count)
+    ]
+
+
+def test_split_by_count_is_contiguous_and_balanced():
+    names = [f"r{i}" for i in range(7)]
+    assert split(names, 3) == [["r0", "r1", "r2"], ["r3", "r4"], ["r5", "r6"]]
+
+
+def test_split_drops_empty_shards():
+    assert split(["r1", "r2"], 5) == [["r1"], ["r2"]]
+    assert split([], 3) == []
+
+
+def test_split_keeps_groups_together():
+    groups = {"a1": "a", "a2": "a", "a3": "a", "b1": "b", "b2": "b", "c1": "c"}
+    shards = split(groups, 2, groups)
+    assert len(shards) == 2
+    for key in "abc":
+        members = {name for name in groups if groups[name] == key}
+        assert sum(bool(members & set(shard)) for shard in shards) == 1
+    # the largest group goes first, the others fill the least loaded shard
+    assert sorted(len(shard) for shard in shards) == [3, 3]
+
+
+def test_split_devices_by_os():
+    devices = make_devices(10)
+    shards = split_devices(devices, 5, by="os")
+    assert sorted(len(shard) for shard in shards) == [2] * 5
+    os_of = {device.name: device.os for device in devices}
+    for shard in shards:
+        assert len({os_of[name] for name in shard}) == 1
+
+
+def test_split_devices_rejects_unknown_keys():
+    with pytest.raises(ValueError):
+        split_devices(make_devices(2), 2, by="rack")
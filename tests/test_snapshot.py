@@ -0,0 +1,83 @@
+"""
+test_snapshot.py
+
+Collecting device commands once into the snapshot cache
+
+"""
+import pytest
+
+from mock import RAW, MockDevice
+from snapshot import CollectionError, SnapshotCache
+
+COMMANDS = {"show version": False, "show cpu usage": False, "show memory": False}
+
+
+class BrokenCommandDevice(MockDevice):
+    """MockDevice failing every "show cpu usage" """
+
+    def execute(self, command, **kwargs):
+        if command == "show cpu usage":
+            self.commands_sent += 1
+            raise TimeoutError("no prompt after 'show cpu usage'")
+        return super().execute(command, **kwargs)
+
+
+def test_each_command_is_sent_once():
+    cache = SnapshotCache()
+    device = MockDevice("fw1", "asa")
+    assert cache.collect_device(device, COMMANDS) == 3
+    assert cache.collect_device(device, COMMANDS) == 0
+    assert device.commands_sent == 3
+    view = cache.device(device)
+    assert view.execute("show memory") == RAW["show memory"]
+    assert device.commands_sent == 3
+
+
+def test_a_failing_command_only_fails_its_own_entry():
+    cache = SnapshotCache()
+    device = BrokenCommandDevice("fw1", "asa")
+    assert cache.collect_device(device, COMMANDS) == 3
+    view = cache.device(device)
+    assert view.execute("show version") == RAW["show version"]
+    assert view.execute("show memory") == RAW["show memory"]
+    with pytest.raises(CollectionError, match="TimeoutError"):
+        view.execute("show cpu usage")
+    # failed commands are sent again by the next collection, and only they
+    assert cache.collect_device(device, COMMANDS) == 1
+
+
+def test_parsed_commands_are_parsed_from_the_collected_output():
+    cache = SnapshotCache()
+    device = MockDevice("r1", "ios")
+    cache.collect_device(device, {"show version": True})
+    assert device.commands_sent == 1
+    assert cache.device(device).parse("show version") == device.parse("show version", output="")
+    assert device.commands_sent == 1
+
+
+def test_commands_not_collected_fall_through_to_the_device():
+    cache = SnapshotCache()
+    device = MockDevice("r1", "ios")
+    view = cache.device(device)
+    raw = view.execute("show cpu usage")
+    assert view.execute("show cpu usage") == raw
+    parsed = view.parse("sh proc cpu")
+    assert view.parse("sh proc cpu") == parsed
+    assert device.commands_sent == 2
+    assert cache.get("r1", "sh proc cpu")["parsed"] == parsed
+
+
+def test_entries_expire_after_the_ttl(tmp_path):
+    path = str(tmp_path / "snapshot.json.gz")
+    device = MockDevice("fw1", "asa")
+    cache = SnapshotCache(path, ttl=60)
+    cache.collect_device(device, COMMANDS)
+    cache.entries["fw1"]["show version"]["time"] -= 61
+    cache.save()
+
+    reloaded = SnapshotCache(path, ttl=60)
+    assert reloaded.get("fw1", "show version") is None
+    assert reloaded.get("fw1", "show memory") is not None
+    assert reloaded.collect_device(device, COMMANDS) == 1
+    # without a ttl an existing file is not reused
+    assert SnapshotCache(path).entries == {}
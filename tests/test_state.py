@@ -0,0 +1,61 @@
+"""
+test_state.py
+
+Reuse decisions of the incremental runs
+
+"""
+import time
+
+import pytest
+
+from runner import DeviceResult
+from state import StateStore
+
+CHECKS = ["last_reload", "cpu_util"]
+FINGERPRINT = {"uptime": 12.0, "interfaces": "abc"}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = StateStore(str(tmp_path / "state.json.gz"))
+    store.begin()
+    store.refresh("r1", FINGERPRINT)
+    for check in CHECKS:
+        store.put("r1", check, DeviceResult("r1"))
+    return store
+
+
+def test_unchanged_device_reuses_its_verdicts(store):
+    assert store.unchanged("r1", {"uptime": 12.5, "interfaces": "abc"}, CHECKS)
+    assert store.reused == {"r1"}
+    assert store.verdict("r1", "cpu_util").passed
+
+
+def test_changed_interfaces_or_reload_are_checked_again(store):
+    assert not store.unchanged("r1", {"uptime": 12.5, "interfaces": "def"}, CHECKS)
+    # the uptime went down: the device reloaded
+    assert not store.unchanged("r1", {"uptime": 0.1, "interfaces": "abc"}, CHECKS)
+    assert store.reused == set()
+
+
+def test_unknown_missing_or_stale_verdicts_are_checked_again(store):
+    assert not store.unchanged("r2", FINGERPRINT, CHECKS)
+    assert not store.unchanged("r1", None, CHECKS)
+    assert not store.unchanged("r1", FINGERPRINT, CHECKS + ["memory_util"])
+    store.devices["r1"]["checked"] = time.time() - store.staleness - 1
+    assert not store.unchanged("r1", FINGERPRINT, CHECKS)
+
+
+def test_errored_results_are_not_cached(store):
+    result = DeviceResult("r1")
+    result.result = "errored"
+    store.put("r1", "memory_util", result)
+    assert store.verdict("r1", "memory_util") is None
+
+
+def test_full_refresh_and_reload_from_disk(store):
+    store.save()
+    reloaded = StateStore(store.path, full_every=2)
+    assert reloaded.runs == 1
+    assert reloaded.begin()
+    assert not reloaded.unchanged("r1", FINGERPRINT, CHECKS)
@@ -0,0 +1,39 @@
+"""
+test_verify_test.py
+
+Outcome of test_connection for hung mock devices
+
+"""
+import pytest
+
+pytest.importorskip("pyats")
+
+import verify_test  # noqa: E402
+from checks import compile_plan  # noqa: E402
+from connection import connect_devices  # noqa: E402
+from deadline import Deadlines  # noqa: E402
+from mock import make_testbed  # noqa: E402
+from snapshot import SnapshotCache  # noqa: E402
+
+
+@pytest.fixture
+def collected():
+    """Mock testbed with one hung device, connected and collected with deadlines"""
+    testbed = make_testbed(3, latency=0.01, slow=1, slow_latency=5, connect_latency=0.01)
+    connect_status = connect_devices(testbed.devices.values(), retries=0)
+    deadlines = Deadlines(max_timeout=0.5, min_timeout=0.1)
+    snapshot = SnapshotCache(wrap=deadlines.device)
+    snapshot.collect(testbed.devices.values(), compile_plan(), workers=3)
+    return testbed, connect_status, deadlines
+
+
+def test_device_hung_during_collection_fails_test_connection(collected, steps):
+    testbed, connect_status, deadlines = collected
+    verify_test.verify_test.test_connection(None, testbed, steps, connect_status, deadlines)
+    assert steps.results() == {
+        "Test Connection Status of ios-00000": "passed",
+        "Test Connection Status of nxos-00001": "passed",
+        "Test Connection Status of iosxe-00002": "failed",
+    }
+    assert "timed out" in steps.children["Test Connection Status of iosxe-00002"].reason
+
@@ -2,44 +2,374 @@
 vefify_test.py
 
 """
-import logging
-import re
+import time
 
-from pyats import aetest
-from unicon.core.errors import TimeoutError, StateMachineError, ConnectionError
-from genie.testbed import load
-from genie.conf import Genie
-from genie import parsergen
-import re
+_import_start = time.perf_counter()
 
-from pprint import pprint
+import contextlib  # noqa: E402
+import functools  # noqa: E402
+import logging  # noqa: E402
+
+from pyats import aetest  # noqa: E402
+
+from checks import CHECKS, compile_plan, load_spec  # noqa: E402
+from connection import connect_devices  # noqa: E402
+from deadline import Deadlines  # noqa: E402
+from metrics import Metrics  # noqa: E402
+from runner import run_steps  # noqa: E402
+from snapshot import SnapshotCache  # noqa: E402
+
+# seconds spent importing this module, reported in the startup profile.
+# Genie is only imported by load_testbed, when the checks parse anything,
+# and the broker, replay, sink and state modules only when their option is set
+IMPORT_TIME = time.perf_counter() - _import_start
 
 # create a logger for this module
 logger = logging.getLogger(__name__)
 
+# default script parameters, overridden by the job file
+parameters = {
+    # maximum number of devices connecting at the same time
+    "connect_workers": 32,
+    # per-device connect timeout in seconds
+    "connect_timeout": 60,
+    # extra connect attempts after the first failure
+    "connect_retries": 2,
+    # base delay in seconds between attempts, doubled on every retry
+    "connect_backoff": 2.0,
+    # number of devices each test checks at the same time
+    "device_workers": 1,
+    # checks to run, any of checks.CHECKS
+    "checks": list(CHECKS),
+    # YAML check spec replacing checks.SPEC, if any
+    "check_plan": None,
+    # gzipped JSON file keeping the command snapshots between runs, if any
+    "snapshot_file": None,
+    # seconds a stored snapshot entry is reused instead of collected again
+    "snapshot_ttl": 0,
+    # store file recording every device output of the run, if any
+    "record_file": None,
+    # store file to replay instead of connecting to the devices, if any
+    "replay_file": None,
+    # report one step per interface instead of one summary per device
+    "interface_detail": False,
+    # regular expressions selecting the interfaces checked by name, if any
+    "interface_include": None,
+    "interface_exclude": None,
+    # leave administratively down interfaces out of the up/down check
+    "ignore_admin_down": False,
+    # device names of the shard run by this task, all devices when None
+    "shard_devices": None,
+    # JSON timing report and Prometheus textfile written at the end, if any
+    "metrics_file": None,
+    "metrics_textfile": None,
+    # number of slowest devices listed in the timing report
+    "metrics_top": 10,
+    # seconds the whole run may take, devices left are skipped as timed out
+    "job_budget": None,
+    # longest a device call may take before the device is given up on, and
+    # the lower bound of the deadlines adapted to its observed latency
+    "device_timeout": None,
+    "min_device_timeout": 10.0,
+    # deadline of a call, as a multiple of the device's latency per command
+    "timeout_factor": 5.0,
+    # state file of incremental runs, which reuse the verdicts of unchanged
+    # devices, if any
+    "state_file": None,
+    # seconds the verdicts of an unchanged device are reused for
+    "state_staleness": 3600,
+    # check every device in full every this many runs, 0 for never
+    "full_refresh_every": 0,
+    # JSON Lines file receiving one record per device and check as each
+    # completes, gzipped if it ends in .gz, if any
+    "results_file": None,
+    # zlib-compress the raw output kept for failed checks
+    "results_compress": False,
+    # Unix socket of a session broker keeping the device sessions warm
+    # between runs, if any. Without a broker there the devices are
+    # connected directly
+    "broker_socket": None,
+}
+
+
+@contextlib.contextmanager
+def timed(profile, name):
+    """Add the seconds spent in the block to profile[name]"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile[name] = profile.get(name, 0.0) + time.perf_counter() - start
+
 
 class CommonSetup(aetest.CommonSetup):
     @aetest.subsection
-    def load_testbed(self, testbed):
-        logger.info(
-            "Converting pyATS testbed to Genie Testbed to support pyATS Library features"
+    def load_testbed(
+        self,
+        testbed,
+        replay_file,
+        shard_devices,
+        checks,
+        check_plan,
+        job_budget,
+        device_timeout,
+        min_device_timeout,
+        timeout_factor,
+    ):
+        # the job budget counts from here
+        deadlines = Deadlines(job_budget, device_timeout, min_device_timeout, timeout_factor)
+        profile = {"import": IMPORT_TIME}
+        with timed(profile, "load_testbed"):
+            if replay_file:
+                # Serve recorded outputs instead of talking to the devices,
+                # limited to the shard or testbed devices when given
+                from replay import OutputStore, ReplayTestbed
+
+                logger.info(f"Replaying device outputs from {replay_file}")
+                names = shard_devices or (list(testbed.devices) if testbed else None)
+                testbed = ReplayTestbed(OutputStore(replay_file), names)
+            else:
+                assert testbed, "Testbed is not provided!"
+                if shard_devices is not None:
+                    # Only keep the devices of this shard, the other shards run
+                    # in their own tasks. Done before the Genie conversion so
+                    # it only converts the devices of the shard
+                    for name in list(testbed.devices):
+                        if name not in shard_devices:
+                            testbed.remove_device(testbed.devices[name])
+                    logger.info(f"Running shard of {len(testbed.devices)} device(s)")
+
+            # Compile the enabled checks into the per-OS dispatch table, for
+            # the OSes of the testbed only
+            os_names = {device.os for device in testbed.devices.values()}
+            plan = compile_plan(load_spec(check_plan), checks, os_names)
+
+            # Genie is only needed to parse outputs: skip importing it, and
+            # converting the testbed, when every planned command of these
+            # OSes uses a fast-path parser. Its parser packages are then
+            # loaded on first use, for the planned OSes and commands only.
+            # Testbeds which are not pyATS ones, e.g. the mock testbeds of
+            # the benchmarks, parse their own outputs
+            from pyats.topology import Testbed
+
+            if replay_file or not isinstance(testbed, Testbed):
+                pass
+            elif plan.parses():
+                logger.info(
+                    "Converting pyATS testbed to Genie Testbed to support pyATS Library features"
+                )
+                from genie.testbed import load
+
+                testbed = load(testbed)
+            else:
+                logger.info(f"No Genie parser needed for {', '.join(sorted(os_names))}")
+        self.parent.parameters.update(
+            testbed=testbed,
+            plan=plan,
+            startup_profile=profile,
+            metrics=Metrics(),
+            deadlines=deadlines,
         )
-        testbed = load(testbed)
-        self.parent.parameters.update(testbed=testbed)
 
     @aetest.subsection
-    def connect(self, testbed):
+    def connect(
+        self,
+        testbed,
+        connect_workers,
+        connect_timeout,
+        connect_retries,
+        connect_backoff,
+        startup_profile,
+        metrics,
+        deadlines,
+        broker_socket,
+    ):
         """
         Connect to the devices
         """
         assert testbed, "Testbed is not provided!"
 
-        # Connect to all testbed devices
-        try:
-            for device in testbed:
-                device.connect()
-        except (TimeoutError, StateMachineError, ConnectionError):
-            logger.error("Unable to connect to all devices")
+        # Reuse the warm sessions of the broker when one is running
+        if broker_socket:
+            from broker import BrokerClient
+
+            client = BrokerClient(broker_socket)
+            if client.available():
+                logger.info(f"Using the device sessions of the broker at {broker_socket}")
+                testbed = client.testbed(testbed)
+                self.parent.parameters.update(testbed=testbed)
+            else:
+                logger.warning(f"No session broker at {broker_socket}, connecting directly")
+
+        # Never wait on a connect beyond the job budget
+        remaining = deadlines.remaining()
+        if remaining is not None:
+            connect_timeout = min(connect_timeout, remaining)
+
+        # Connect to all testbed devices in parallel. A failing device is
+        # recorded and skipped, it no longer stops the remaining connects
+        with timed(startup_profile, "connect"):
+            connect_status = connect_devices(
+                [metrics.timed(device) for device in testbed.devices.values()],
+                workers=connect_workers,
+                timeout=connect_timeout,
+                retries=connect_retries,
+                backoff=connect_backoff,
+            )
+        self.parent.parameters.update(connect_status=connect_status)
+
+        # A first connect is the earliest latency seen from a device, the
+        # deadlines adapt from there
+        for name, status in connect_status.items():
+            if status.connected and status.attempts == 1:
+                deadlines.observe(name, status.duration)
+
+        failed = [name for name, status in connect_status.items() if not status.connected]
+        if failed:
+            logger.error(f"Unable to connect to {len(failed)} device(s): {', '.join(failed)}")
+
+    @aetest.subsection
+    def collect(
+        self,
+        testbed,
+        checks,
+        check_plan,
+        plan,
+        device_workers,
+        snapshot_file,
+        snapshot_ttl,
+        record_file,
+        startup_profile,
+        metrics,
+        deadlines,
+        state_file,
+        state_staleness,
+        full_refresh_every,
+        results_file,
+        results_compress,
+    ):
+        """
+        Send every command the enabled checks need, once per device
+        """
+        with timed(startup_profile, "collect"):
+            store = None
+            if record_file:
+                from replay import OutputStore
+
+                store = OutputStore(record_file)
+
+            # Time every command and hold it to the device deadline, and
+            # record every output sent back by the devices when asked to
+            def wrap(device):
+                device = deadlines.device(metrics.timed(device))
+                return store.recording(device) if store is not None else device
+
+            snapshot = SnapshotCache(path=snapshot_file, ttl=snapshot_ttl, wrap=wrap)
+            devices = list(testbed.devices.values())
+            sent = 0
+            state = None
+            if state_file:
+                from state import FINGERPRINT_CHECKS, StateStore, fingerprint
+
+                state = StateStore(state_file, state_staleness, full_refresh_every)
+                if state.begin():
+                    logger.info(f"Run {state.runs}: full refresh of every device")
+                # Collect the fingerprint commands of the enabled checks
+                # first, they are part of the full check set of the devices
+                # which changed. Without any, every device is checked in full
+                enabled = [name for name in FINGERPRINT_CHECKS if name in checks]
+                if not enabled:
+                    logger.warning(
+                        f"None of {', '.join(FINGERPRINT_CHECKS)} is enabled to fingerprint "
+                        "the devices, every device is checked in full"
+                    )
+                fingerprints = compile_plan(load_spec(check_plan), enabled, set(plan.dispatch))
+                sent += snapshot.collect(devices, fingerprints, workers=device_workers)
+                changed = []
+                for device in devices:
+                    new = None
+                    if device.connected:
+                        new = fingerprint(fingerprints, snapshot.device(device))
+                    if not state.unchanged(device.name, new, checks):
+                        state.refresh(device.name, new)
+                        changed.append(device)
+                logger.info(
+                    f"{len(state.reused)} unchanged device(s) reuse their verdicts, "
+                    f"{len(changed)} checked in full"
+                )
+                devices = changed
+            sent += snapshot.collect(devices, plan, workers=device_workers)
+            snapshot.save()
+        logger.info(f"Collected device snapshots with {sent} command(s)")
+        sink = None
+        if results_file:
+            from sink import ResultSink
+
+            sink = ResultSink(results_file, results_compress)
+        self.parent.parameters.update(snapshot=snapshot, state=state, sink=sink)
+
+        # Everything up to the first test is startup time
+        metrics.sections.update(startup_profile)
+        logger.info(
+            "Startup profile: "
+            + ", ".join(f"{name} {seconds:.3f}s" for name, seconds in startup_profile.items())
+            + f", total {sum(startup_profile.values()):.3f}s"
+        )
+
+
+# Device checks. Each one runs against a single device and records its
+# outcome into a runner.DeviceResult, which mirrors the pyATS step API
+# (start/failed) so the testcases can replay it into the report in order.
+
+
+def check_threshold(device, step, plan, name):
+    """Compare the values the plan extracts for a check with its threshold"""
+    check = plan.get(name, device.os)
+    if check is None or not device.connected:
+        return
+    failed = 0
+    for label, value, passed in check.evaluate(device):
+        if passed:
+            step.info(f"{device.name}, {label} {value}, {check.passed}: {device.connected}")
+        else:
+            step.error(f"{device.name}, {label} {value}, {check.failed}: {device.connected}")
+            failed += 1
+    if failed:
+        step.failed(check.failed)
+
+
+def check_updown_validation(
+    device, device_step, plan, detail=False, include=None, exclude=None, ignore_admin_down=False
+):
+    check = plan.get("updown_validation", device.os)
+    if check is None or not device.connected:
+        return
+    device_name = device.name
+    table = check.values(device)
+    indexes = table.select(include, exclude, ignore_admin_down)
+    if detail:
+        device_step.pprint({table.names[i]: table.state(i) for i in range(len(table))})
+        # Check each interface in its own step
+        for i in indexes:
+            with device_step.start(f"Checking Interface Up/Down of {table.names[i]}") as interface_step:
+                # If status (and protocol, where there is one) is up, log as pass
+                if table.is_up(i):
+                    interface_step.info("\nPASS: Interface {intf} status is: '{s}'".format(intf=table.names[i], s=table.state(i)))
+                # Else, mark it as fail. Interface step is failed
+                else:
+                    interface_step.info("\nFAIL: Interface {intf} status is: '{s}'".format(intf=table.names[i], s=table.state(i)))
+                    interface_step.failed()
+        return
+    # Check all interfaces at once and only report the failing ones
+    summary = table.summary(indexes)
+    device_step.info(
+        f"{device_name}, {summary['up']}/{summary['checked']} interfaces up "
+        f"({summary['total'] - summary['checked']} filtered out of {summary['total']})"
+    )
+    if summary['failing']:
+        failing = ", ".join(f"{name} '{state}'" for name, state in summary['failing'])
+        device_step.error(f"{device_name}, {summary['down']} interface(s) not up: {failing}")
+        device_step.failed(f"{summary['down']} interface(s) not up")
 
 
 class verify_test(aetest.Testcase):
@@ -48,318 +378,202 @@ class verify_test(aetest.Testcase):
     """
 
     @aetest.test
-    def test_connection(self, testbed, steps):
+    def test_connection(self, testbed, steps, connect_status, deadlines):
         # Loop over every device in the testbed
         for device_name, device in testbed.devices.items():
             with steps.start(
                 f"Test Connection Status of {device_name}", continue_=True
             ) as step:
+                status = connect_status.get(device_name)
+                # A device which timed out during the collection fails here,
+                # the tests skip it
+                if device_name in deadlines.timed_out:
+                    reason = f"{device_name} timed out: {deadlines.timed_out[device_name]}"
+                    logger.error(reason)
+                    step.failed(reason)
                 # Test "connected" status
-                if device.connected:
-                    logger.info(f"{device_name} connected status: {device.connected}")
+                elif device.connected:
+                    logger.info(f"{device_name} connected status: {device.connected}, {status}")
                 # Step fails if connection fails
                 else:
-                    logger.error(f"{device_name} connected status: {device.connected}")
+                    logger.error(f"{device_name} connected status: {device.connected}, {status}")
+                    if status is not None and status.error:
+                        logger.error(f"{device_name} last connect error: {status.error}")
                     step.failed()
 
-
+    @aetest.test
+    def test_last_reload(
+        self,
+        testbed,
+        steps,
+        device_workers,
+        checks,
+        plan,
+        snapshot,
+        metrics,
+        deadlines,
+        state,
+        sink,
+    ):
+        if "last_reload" not in checks:
+            self.skipped("last_reload is not enabled")
+        check = functools.partial(check_threshold, plan=plan, name="last_reload")
+        run_steps(
+            steps,
+            testbed,
+            "Test last reload of {}",
+            check,
+            snapshot,
+            device_workers,
+            plan,
+            metrics,
+            deadlines,
+            state,
+            sink,
+            "last_reload",
+        )
 
     @aetest.test
-    def test_last_reload(self, testbed, steps):
-        # Loop over every device in the testbed
-        for device_name, device in testbed.devices.items():
-            
-            with steps.start(
-                f"Test last reload of {device_name}", continue_=True
-            ) as step:
-                if device.os in ("ios", "nxos"):
-                    if device.connected:
-                        # Parse show version
-                        show_version_output = device.parse("show version")
-                        print(show_version_output)
-                        # If the upptime was more than 1 day, we log it as passing. If not, we mark it as failed
-                        if show_version_output['platform']['kernel_uptime']['days'] > 1:
-                            logger.info(f"{device_name}, {show_version_output['platform']['kernel_uptime']['days']} There was no reload within 1 day : {device.connected}")
-                        else:
-                            logger.error(f"{device_name}, {show_version_output['platform']['kernel_uptime']['days']} There was recent reload within 1 day: {device.connected}")
-                            step.failed()
-                if device.os in ("iosxe"):
-                    if device.connected:
-                        # Parse show version
-                        show_version_output = device.parse("show version")
-                        print(show_version_output)
-                        # If the upptime was more than 1 day, we log it as passing. If not, we mark it as failed
-                        if not '0 weeks' in show_version_output['version']['uptime']:
-                            if not '0 days' in show_version_output['version']['uptime']:
-                                logger.info(f"{device_name}, {show_version_output['version']['uptime']} There was no reload within 1 day : {device.connected}")
-                            else:
-                                logger.error(f"{device_name}, {show_version_output['version']['uptime']} There was recent reload within 1 day: {device.connected}")
-                                step.failed()
-                if device.os in ("asa"):
-                    if device.connected:
-                        # Execute show version for ASA
-                        show_version_output = device.execute("show version")
-                        print(show_version_output)
-                        up_time = [line for line in show_version_output.splitlines() if 'up ' in line]
-                        # If the upptime was more than 1 day, we log it as passing. If not, we mark it as failed
-                        if not '0 weeks' in up_time:
-                            if not '0 days' in up_time:
-                                logger.info(f"{device_name}, {up_time} There was no reload within 1 day : {device.connected}")
-                            else:
-                                logger.error(f"{device_name}, {up_time} There was recent reload within 1 day: {device.connected}")
-                                step.failed()
-                if device.os in ("fxos"):
-                    if device.connected:
-                        # Execute show version for FXOS
-                        show_version_output = device.execute("show version system")
-                        print(show_version_output)
-                        up_time = [line for line in show_version_output.splitlines() if 'up ' in line]
-                        # If the upptime was more than 1 day, we log it as passing. If not, we mark it as failed
-                        if not '0 weeks' in up_time:
-                            if not '0 days' in up_time:
-                                logger.info(f"{device_name}, {up_time} There was no reload within 1 day : {device.connected}")
-                            else:
-                                logger.error(f"{device_name}, {up_time} There was recent reload within 1 day: {device.connected}")
-                                step.failed()
+    def test_updown_validation(
+        self,
+        testbed,
+        steps,
+        device_workers,
+        checks,
+        plan,
+        snapshot,
+        metrics,
+        deadlines,
+        state,
+        sink,
+        interface_detail,
+        interface_include,
+        interface_exclude,
+        ignore_admin_down,
+    ):
+        if "updown_validation" not in checks:
+            self.skipped("updown_validation is not enabled")
+        check = functools.partial(
+            check_updown_validation,
+            plan=plan,
+            detail=interface_detail,
+            include=interface_include,
+            exclude=interface_exclude,
+            ignore_admin_down=ignore_admin_down,
+        )
+        run_steps(
+            steps,
+            testbed,
+            "Test Up/Down Status of {}",
+            check,
+            snapshot,
+            device_workers,
+            plan,
+            metrics,
+            deadlines,
+            state,
+            sink,
+            "updown_validation",
+        )
 
+    @aetest.test
+    def test_cpu_util(
+        self,
+        testbed,
+        steps,
+        device_workers,
+        checks,
+        plan,
+        snapshot,
+        metrics,
+        deadlines,
+        state,
+        sink,
+    ):
+        if "cpu_util" not in checks:
+            self.skipped("cpu_util is not enabled")
+        check = functools.partial(check_threshold, plan=plan, name="cpu_util")
+        run_steps(
+            steps,
+            testbed,
+            "Test cpu util of {}",
+            check,
+            snapshot,
+            device_workers,
+            plan,
+            metrics,
+            deadlines,
+            state,
+            sink,
+            "cpu_util",
+        )
 
     @aetest.test
-    def test_updown_validation(self, testbed, steps):
-        # Loop over every device in the testbed
-        for device_name, device in testbed.devices.items():
-            with steps.start(
-                f"Test Up/Down Status of {device_name}", continue_=True
-            ) as device_step:
-                if device.os in ('iosxe'):
-                    if device.connected:
-                        # Use the parse command below to get the output. 
-                        intf_output = device.parse('show ip interface brief')
-                        # For each interface in the output, use for loop to iterate over the JSON output.
-                        for interface in intf_output['interface']:
-                            with device_step.start(
-                                f"Checking Interface Up/Down of {interface}", continue_=True
-                            ) as interface_step:
-                                # Set status with the obtained values from the JSON
-                                status = intf_output['interface'][interface]['status']
-                                # Set protocol with the obtained values from the JSON
-                                protocol = intf_output['interface'][interface]['protocol']
-                                # If both status and protocol are up, log as pass
-                                if status == 'up' and protocol == 'up':
-                                    logger.info("\nPASS: Interface {intf} status is: '{s}, {p}'".format(intf=interface, s=status, p=protocol))
-                                # Else, mark it as failed
-                                else:
-                                    logger.info("\nFAIL: Interface {intf} status is: '{s}, {p}'".format(intf=interface, s=status, p=protocol))
-                                    interface_step.failed()
-                if device.os in ('nxos'):
-                    if device.connected:
-                        # Execute command below to get the output
-                        intf_output = device.parse('show interface brief')
-                        # For each interface in the output, use for loop to iterate over the JSON output
-                        for interface in intf_output['interface']['ethernet']:
-                            with device_step.start(
-                                f"Checking Interface Up/Down of {interface}", continue_=True
-                            ) as interface_step:
-                                # Set status with the obtained values from the JSON
-                                status = intf_output['interface']['ethernet'][interface]['status']
-                                # If status is up, log as pass
-                                if status == 'up':
-                                    logger.info("\nPASS: Interface {intf} status is: '{s}'".format(intf=interface, s=status))
-                                else:
-                                    logger.info("\nFAIL: Interface {intf} status is: '{s}'".format(intf=interface, s=status))
-                                    interface_step.failed()
-                if device.os in ('asa'):
-                    if device.connected:
-                        # Execute command below to get the output with the newly created parsing.
-                        output = device.execute("show interface ip brief")
-                        # Set the headers for using parsergen
-                        header=[ "Interface","IP-Address","OK\?","Method","Status","Protocol" ]
-                        # Use parsergen to get the result
-                        result = parsergen.oper_fill_tabular(device_output=output, device_os='asa', header_fields=header, index=[0])
-                        pprint(result.entries)
-                        # For each interface in the output, use for loop to iterate over output
-                        for interface in result.entries:
-                            with device_step.start(
-                                f"Checking Interface Up/Down of {interface}", continue_=True
-                            ) as interface_step:
-                                # Set status with the obtained values from the JSON
-                                status = result.entries[interface]['Status']
-                                # Set pprotocol with the obtained values from the JSON                                
-                                protocol = result.entries[interface]['Protocol']
-                                # If both status and protocol are up, log as pass
-                                if status == 'up' and protocol == 'up':
-                                    logger.info("\nPASS: Interface {intf} status is: '{s}, {p}'".format(intf=interface, s=status, p=protocol))
-                                # Else, mark it as fail. Interface step is failed
-                                else:
-                                    logger.info("\nFAIL: Interface {intf} status is: '{s}, {p}'".format(intf=interface, s=status, p=protocol))
-                                    interface_step.failed()
-                if device.os in ('fxos'):
-                    if device.connected:
-                        # Execute command below to get the output. Create new praser for fxos
-                        output = device.execute("show interface ip brief")
-                        # Set the headers for using parsergen
-                        header=[ "Interface","IP-Address","OK\?","Method","Status","Protocol" ]
-                        # Use parsergen to get the result
-                        result = parsergen.oper_fill_tabular(device_output=output, device_os='asa', header_fields=header, index=[0])
-                        pprint(result.entries)
-                        # For each interface in the output, use for loop to iterate over output
-                        for interface in result.entries:
-                            with device_step.start(
-                                f"Checking Interface Up/Down of {interface}", continue_=True
-                            ) as interface_step:
-                                # Set status with the obtained values from the JSON
-                                status = result.entries[interface]['Status']
-                                # Set pprotocol with the obtained values from the JSON                                                                
-                                protocol = result.entries[interface]['Protocol']
-                                # If both status and protocol are up, log as pass
-                                if status == 'up' and protocol == 'up':
-                                    logger.info("\nPASS: Interface {intf} status is: '{s}, {p}'".format(intf=interface, s=status, p=protocol))
-                                # Else, mark it as fail. Interface step is failed
-                                else:
-                                    logger.info("\nFAIL: Interface {intf} status is: '{s}, {p}'".format(intf=interface, s=status, p=protocol))
-                                    interface_step.failed()
+    def test_memory_util(
+        self,
+        testbed,
+        steps,
+        device_workers,
+        checks,
+        plan,
+        snapshot,
+        metrics,
+        deadlines,
+        state,
+        sink,
+    ):
+        if "memory_util" not in checks:
+            self.skipped("memory_util is not enabled")
+        check = functools.partial(check_threshold, plan=plan, name="memory_util")
+        run_steps(
+            steps,
+            testbed,
+            "Test memory utilization of {}",
+            check,
+            snapshot,
+            device_workers,
+            plan,
+            metrics,
+            deadlines,
+            state,
+            sink,
+            "memory_util",
+        )
 
 
-    @aetest.test
-    def test_cpu_util(self, testbed, steps):
-        # Loop over every device in the testbed
-        for device_name, device in testbed.devices.items():
-            
-            with steps.start(
-                f"Test cpu util of {device_name}", continue_=True
-            ) as step:
-                if device.os in ("ios", "iosxr", "nxos"):
-                    if device.connected:
-                        # Parse the command to get the output
-                        cpu_util = device.parse("sh proc cpu")
-                        # Get the CPU level
-                        if cpu_util['kernel_percent']:
-                            cpu_util_kernel = cpu_util['kernel_percent']
-                            cpu_util_kernel = float(cpu_util_kernel)
-                            print(cpu_util_kernel)
-                            # If level is less than declared value, we mark it good - pass
-                            if cpu_util['kernel_percent'] < 40.0:
-                                logger.info(f"{device_name}, {cpu_util_kernel} cpu_util is good: {device.connected}")
-                            else:
-                                logger.error(f"{device_name}, {cpu_util_kernel} cpu_util is bad: {device.connected}")
-                                step.failed()
-                if device.os in ('asa'):
-                    if device.connected:
-                        # Execute the command as parser does not exist
-                        output = device.execute('show cpu usage')
-                        # Perform Regex to get the data
-                        cpu_percent = re.findall(r'\d+%', output)
-                        output = [i.strip('%') for i in cpu_percent]
-                        output = [float(i) for i in output]
-                        # If level is less than declared value, we mark it good - pass
-                        for i in output:
-                            if i < 40.0:
-                                logger.info(f"{device_name}, {i}, cpu_util is good: {device.connected}")
-                            else:
-                                logger.error(f"{device_name}, {i}, cpu_util is bad: {device.connected}")
-                                step.failed()
-                if device.os in ('fxos'):
-                    if device.connected:
-                        # Execute the command as parser does not exist
-                        output = device.execute('show cpu')
-                        # Perform Regex to get the data
-                        cpu_percent = re.findall(r'\d+%', output)
-                        output = [i.strip('%') for i in cpu_percent]
-                        final_cpu_util = [float(i) for i in output]
-                        # If level is less than declared value, we mark it good - pass
-                        for i in final_cpu_util:
-                            if i < 40.0:
-                                logger.info(f"{device_name}, {i}, cpu_util is good: {device.connected}")
-                            else:
-                                logger.error(f"{device_name}, {i}, cpu_util is bad: {device.connected}")
-                                step.failed()
-                if device.os in ("iosxe"):
-                    if device.connected:
-                        # Parse the command to get the output
-                        cpu_util = device.parse("sh proc cpu")
-                        # Compare the level with the declared value
-                        if cpu_util['five_sec_cpu_total'] or cpu_util['one_min_cpu'] or cpu_util['five_min_cpu'] < 40:
-                            logger.info(f"{device_name}, {cpu_util['five_sec_cpu_total'], cpu_util['one_min_cpu'], cpu_util['five_min_cpu']} cpu_util is good: {device.connected}")
-                        else:
-                            logger.error(f"{device_name}, {cpu_util['five_sec_cpu_total'], cpu_util['one_min_cpu'], cpu_util['five_min_cpu']} cpu_util is bad: {device.connected}")
-                            step.failed()
+class CommonCleanup(aetest.CommonCleanup):
+    @aetest.subsection
+    def write_metrics(self, metrics, metrics_file, metrics_textfile, metrics_top):
+        """
+        Report where the run spent its time
+        """
+        metrics.log_summary()
+        if metrics_file:
+            metrics.write_json(metrics_file, metrics_top)
+            logger.info(f"Timing report written to {metrics_file}")
+        if metrics_textfile:
+            metrics.write_textfile(metrics_textfile, metrics_top)
 
+    @aetest.subsection
+    def close_results(self, sink):
+        """
+        Close the result records file
+        """
+        if sink is not None:
+            sink.close()
+
+    @aetest.subsection
+    def save_state(self, state):
+        """
+        Keep the fingerprints and verdicts for the next incremental run
+        """
+        if state is not None:
+            state.save()
 
-    @aetest.test
-    def test_memory_util(self, testbed, steps):
-        # Loop over every device in the testbed
-        for device_name, device in testbed.devices.items():
-            
-            with steps.start(
-                f"Test memory utilization of {device_name}", continue_=True
-            ) as step:
-                if device.os in ("ios", "iosxr", "nxos"):
-                    if device.connected:
-                        # Execute command below to ge the output
-                        output = device.execute("show system resource")
-                        # Find the line 
-                        memory_usage = [line for line in output.splitlines() if 'Memory usage' in line]
-                        # Find all with the memory usage w/ regex
-                        memory_usage_list = re.findall(r'\d+', str(memory_usage))
-                        memory_comparison = [float(i) for i in memory_usage_list]
-                        # Divide to get the percentage of the used memory
-                        memory_util_percentage = memory_comparison[1] / memory_comparison[0]
-                        print(memory_util_percentage)
-                        # Compare and if it's below .8, we mark it sufficient for passing
-                        if memory_util_percentage < .80:
-                            logger.info(f"{device_name}, {memory_util_percentage} memory_util is good: {device.connected}")
-                        else:
-                            logger.error(f"{device_name}, {memory_util_percentage} memory_util is bad: {device.connected}")
-                            step.failed()
-                if device.os in ('iosxe'):
-                    if device.connected:
-                        # Execute command below to get the output
-                        memory_output = device.execute('show platform software status control-processor brief')
-                        # Perform Regex to get the output for specific OS varaint
-                        memory_percent = re.findall(r'\d+%', memory_output)
-                        # Strip out percent for simple comparison and for consistensy
-                        stripped_memory = [i.strip('%') for i in memory_percent]
-                        memory_comparison = [float(i) for i in stripped_memory]
-                        # Compare and if it's below 80, we mark it sufficient for passing
-                        if memory_comparison[0] < 80:
-                            logger.info(f"{device_name}, {memory_comparison[0]}, cpu_util is good: {device.connected}")
-                        else:
-                            logger.error(f"{device_name}, {memory_comparison[0]}, cpu_util is bad: {device.connected}")
-                            step.failed()
-                if device.os in ('asa'):
-                    if device.connected:
-                        memory_output = device.execute('show memory')
-                        ## Obtain line containing 'Used Memory' from device
-                        memory_usage = [line for line in memory_output.splitlines() if 'Used memory' in line]
-                        # Perform Regex to get the output for specific OS varaint
-                        memory_percent = re.findall(r'\d+%', str(memory_usage))
-                        stripped_memory = [i.strip('%') for i in memory_percent]
-                        memory_comparison = [float(i) for i in stripped_memory]
-                        # Compare and if it's below 80, we mark it sufficient for passing
-                        if memory_comparison[0] < 80:
-                            logger.info(f"{device_name}, {memory_comparison[0]}, cpu_util is good: {device.connected}")
-                        else:
-                            logger.error(f"{device_name}, {memory_comparison[0]}, cpu_util is bad: {device.connected}")
-                            step.failed()
-                if device.os in ('fxos'):
-                    if device.connected:
-                        memory_output = device.execute('show memory')
-                        ## Obtain Used Memory from device
-                        memory_usage = [line for line in memory_output.splitlines() if 'Used memory' in line]
-                        # Perform Regex to get the output for specific OS varaint
-                        memory_percent = re.findall(r'\d+%', str(memory_usage))
-                        stripped_memory = [i.strip('%') for i in memory_percent]
-                        memory_comparison = [float(i) for i in stripped_memory]
-                        # Compare and if it's below 80, we mark it sufficient for passing
-                        if memory_comparison[0] < 80:
-                            logger.info(f"{device_name}, {memory_comparison[0]}, cpu_util is good: {device.connected}")
-                        else:
-                            logger.error(f"{device_name}, {memory_comparison[0]}, cpu_util is bad: {device.connected}")
-                            step.failed()
-
-
-# class CommonCleanup(aetest.CommonCleanup):
 #     @aetest.subsection
 #     def disconnect_device(self,testbed):
+#         from unicon.core.errors import TimeoutError, StateMachineError, ConnectionError
+#
 #         try:
 #             for device in testbed:
 #                 device.disconnect()